@@ -1,84 +1,44 @@
-from flask import Flask, render_template_string
+from flask import Flask, render_template_string, jsonify, request
 import folium
-import serial
-import time
-import threading
+import atexit
+import os
+import sys
 
-app = Flask(__name__)
-
-# GPS initialization
-latitude = None
-longitude = None
-
-# Lock to protect shared resource (latitude and longitude)
-gps_lock = threading.Lock()
-
-# Open the serial port (adjust to /dev/serial0 based on your results)
-ser = serial.Serial('/dev/ttyACM0', baudrate=9600, timeout=1)
+# Shared modules (GPS reader, ...) live in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from gps_reader import open_gps_reader
 
-def parse_gps_data(data):
-    """Parse the NMEA sentence to extract latitude and longitude."""
-    global latitude, longitude
-    try:
-        parts = data.split(",")
-        
-        # Handle $GPGGA sentence: Global Positioning System Fix Data
-        if parts[0] == "$GPGGA":
-            # Ensure there are enough parts and check if latitude and longitude are available
-            if len(parts) >= 6 and parts[2] and parts[4]:
-                lat_deg = float(parts[2]) // 100  # Degrees (before the dot)
-                lat_min = float(parts[2]) % 100  # Minutes (after the dot)
-                lon_deg = float(parts[4]) // 100  # Degrees (before the dot)
-                lon_min = float(parts[4]) % 100  # Minutes (after the dot)
-                
-                # Convert minutes to decimal degrees
-                lat = lat_deg + (lat_min / 60)
-                lon = lon_deg + (lon_min / 60)
-                
-                # Apply direction
-                if parts[3] == "S":  # South hemisphere
-                    lat = -lat
-                if parts[5] == "W":  # West hemisphere
-                    lon = -lon
+app = Flask(__name__)
 
-                # Lock the shared resource before updating
-                with gps_lock:
-                    latitude = lat
-                    longitude = lon
-                print(f"Latitude: {lat}, Longitude: {lon}")
-            else:
-                print("Invalid data in $GPGGA sentence (missing latitude or longitude).")
-                
-    except Exception as e:
-        print(f"Error parsing data: {e}")
+# GPS serial port (adjust to /dev/serial0 based on your results; GPS_PORT overrides it, e.g. a replay)
+gps_port = '/dev/ttyACM0'
 
-def read_gps_data():
-    """Read and process GPS data indefinitely."""
-    try:
-        while True:
-            data = ser.readline()
-            if data:
-                decoded_data = data.decode('utf-8').strip()  # Decode the data
-                print(f"Raw Data: {decoded_data}")  # Print raw NMEA data
-                parse_gps_data(decoded_data)  # Parse the NMEA sentence for GPS info
+def on_gps_fix(fix):
+    """Print every new fix."""
+    print(f"Latitude: {fix.lat}, Longitude: {fix.lon}")
 
-            time.sleep(1)  # Delay to avoid overwhelming the output
-    except KeyboardInterrupt:
-        print("GPS reading stopped.")
-    except Exception as e:
-        print(f"Error: {e}")
+# Drains the port on its own thread; gps.latest() is the newest fix as one consistent snapshot
+gps = open_gps_reader(gps_port, on_gps_fix)
+atexit.register(gps.stop)  # Stops the reader and closes a GPS_LOG recording however we exit
 
 @app.route('/')
 def index():
-    # Check if valid coordinates are available
-    if latitude is None or longitude is None:
+    # One snapshot, so latitude and longitude always come from the same fix
+    fix = gps.latest().fix
+    if fix is None:
         return "Waiting for GPS data..."
+    latitude, longitude = fix.lat, fix.lon
 
     # Create a Folium map centered around the GPS coordinates
     m = folium.Map(location=[latitude, longitude], zoom_start=15)
 
-    # Add a marker with the current GPS coordinates
-    folium.Marker([latitude, longitude], popup=f"Lat: {latitude}, Lon: {longitude}", icon=folium.Icon(color='blue')).add_to(m)
+    # Add a marker with the current GPS coordinates (grey once the fix is more than a few seconds old)
+    age = gps.fix_age()
+    color = 'blue' if age is not None and age < 5 else 'gray'
+    popup = f"Lat: {latitude}, Lon: {longitude}"
+    if age is not None:
+        popup += f" ({age:.1f} s old)"
+    folium.Marker([latitude, longitude], popup=popup, icon=folium.Icon(color=color)).add_to(m)
 
     # Render the map directly in the response using HTML
     map_html = m._repr_html_()  # Folium's internal method to get HTML of the map
@@ -95,11 +55,22 @@ def index():
         </html>
     """, map_html=map_html)
 
+@app.route('/gps_fix')
+def gps_fix():
+    """The newest fix; with ?after=<seq> waits (up to 10 s) until a newer one than that arrives."""
+    after = request.args.get('after', type=int)
+    snapshot = gps.wait_for_fix(after, timeout=10) if after is not None else gps.latest()
+    fix = snapshot.fix
+    return jsonify(seq=snapshot.seq, fix=fix._asdict() if fix is not None else None)
+
+@app.route('/gps_status')
+def gps_status():
+    """Fix age and reader counters (sentences, dropped, serial backlog)."""
+    return jsonify(gps.report())
+
 if __name__ == '__main__':
     # Start the GPS data reading in a separate thread
-    gps_thread = threading.Thread(target=read_gps_data)
-    gps_thread.daemon = True  # Allows the thread to exit when the main program ends
-    gps_thread.start()
+    gps.start()
 
     # Start the Flask app with external IP access
     app.run(host='0.0.0.0', port=5006, debug=True)
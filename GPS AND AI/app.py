@@ -1,31 +1,38 @@
-import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
 import mysql.connector
-import threading
+import atexit
 import time
-import serial
+import threading
 import folium
-from flask import Flask, render_template, Response
-import io
+from flask import Flask, render_template, Response, jsonify, request
 import os
+import sys
+
+# Shared modules (frame sources, pipeline, ...) live in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_source import open_source
+from model_registry import load_model, model_timings
+from overlay import OverlayRenderer
+from stream_quality import StreamStats
+from frame_broadcaster import FrameBroadcaster
+from video_socket import StreamFrame
+from async_server import serve, mjpeg_route
+from gps_reader import open_gps_reader
 
 # Flask app setup
 app = Flask(__name__)
 
 # Set up the camera with Picam
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
+
+# Load the YOLOv8 model in the background so the server can start right away
+# (looked up in MODEL_DIR, the repository root, the working directory and the home directory)
+model = load_model("yolov8n_ncnn_model")
 
-# Get the absolute path of the model
-model_path = "/home/hasin/yolov8n_ncnn_model"
+# Draws every detected class, in place, instead of results[0].plot() copying and styling the whole frame
+overlay = OverlayRenderer()
 
-# Load the YOLOv8 model
-model = YOLO(model_path)
+# Per-client JPEG quality, size and bytes sent
+stream_stats = StreamStats()
 
 # Set up MySQL database connection
 db = mysql.connector.connect(
@@ -40,12 +47,7 @@ cursor = db.cursor()
 db_lock = threading.Lock()
 
 # GPS Serial port setup
-gps_port = "/dev/serial0"  # Adjust based on your setup
-ser = serial.Serial(gps_port, baudrate=9600, timeout=1)
-
-# Global variables for GPS coordinates
-latitude = None
-longitude = None
+gps_port = "/dev/serial0"  # Adjust based on your setup (GPS_PORT overrides it, e.g. a replay)
 
 # Function to store detection result in DB
 def store_detection(name, latitude, longitude):
@@ -59,72 +61,68 @@ def store_detection(name, latitude, longitude):
     except Exception as e:
         print(f"Error saving detection to DB: {e}")
 
-# Function to parse GPS data
-def parse_gps_data(data):
-    global latitude, longitude
-    try:
-        parts = data.split(",")
-        if parts[0] == "$GPGGA":
-            if len(parts) >= 6 and parts[2] and parts[4]:
-                lat_deg = float(parts[2]) // 100  # Degrees
-                lat_min = float(parts[2]) % 100  # Minutes
-                lon_deg = float(parts[4]) // 100  # Degrees
-                lon_min = float(parts[4]) % 100  # Minutes
-                lat = lat_deg + (lat_min / 60)
-                lon = lon_deg + (lon_min / 60)
-                if parts[3] == "S":  # South hemisphere
-                    lat = -lat
-                if parts[5] == "W":  # West hemisphere
-                    lon = -lon
-                latitude = lat
-                longitude = lon
-                print(f"GPS - Latitude: {lat}, Longitude: {lon}")
-    except Exception as e:
-        print(f"Error parsing GPS data: {e}")
+# Print every new GPS fix
+def on_gps_fix(fix):
+    print(f"GPS - Latitude: {fix.lat}, Longitude: {fix.lon}")
 
-# GPS data reading thread
-def read_gps_data():
-    try:
-        while True:
-            data = ser.readline()
-            if data:
-                decoded_data = data.decode('utf-8').strip()
-                parse_gps_data(decoded_data)
-            time.sleep(1)
-    except Exception as e:
-        print(f"Error reading GPS data: {e}")
-
-# Start GPS thread
-gps_thread = threading.Thread(target=read_gps_data)
-gps_thread.daemon = True
-gps_thread.start()
+# GPS data reading thread, draining every sentence as it arrives
+gps = open_gps_reader(gps_port, on_gps_fix).start()
+atexit.register(gps.stop)  # Stops the reader and closes a GPS_LOG recording however we exit
 
 # Create the map using Folium
 def create_map():
-    gps_map = folium.Map(location=[latitude, longitude], zoom_start=13)
-    folium.Marker([latitude, longitude], popup="Detected Location").add_to(gps_map)
+    fix = gps.latest().fix  # One snapshot, so latitude and longitude come from the same fix
+    location = [fix.lat, fix.lon] if fix is not None else None
+    gps_map = folium.Map(location=location, zoom_start=13)
+    if location is not None:
+        folium.Marker(location, popup="Detected Location").add_to(gps_map)
     return gps_map
 
 # Generate AI camera view
 def generate_camera_feed():
-    while True:
-        frame = picam2.capture_array()
-        results = model(frame)
-        annotated_frame = results[0].plot()
-        
-        ret, jpeg = cv2.imencode('.jpg', annotated_frame)
-        if ret:
-            return jpeg.tobytes()
+    frame = picam2.capture_array()
+    results = model(frame)
+    overlay.render(frame, results)
+    return StreamFrame(frame, {})
+
+# One loop captures and detects for every viewer (paused while nobody is watching)
+broadcaster = FrameBroadcaster(generate_camera_feed).start()
 
 # Flask route to serve the camera feed
 @app.route('/video_feed')
 def video_feed():
+    # Optional ?fps=...&kbps=... set this client's targets
+    stream = stream_stats.open("mjpeg", request.args)
+
     def generate():
-        while True:
-            frame = generate_camera_feed()
+        for shared in broadcaster.subscribe():
+            # Encoded at the quality and size this client's link can keep up with (shared per level)
+            frame = shared.jpeg(quality=stream.quality, scale=stream.scale)
+            if frame is None:
+                continue
+            started = time.monotonic()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+            # Resumed once the chunk is written, so this measures how fast the client takes frames
+            stream.record(len(frame), time.monotonic() - started)
+    response = Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.call_on_close(lambda: stream_stats.close(stream))
+    return response
+
+# Flask route to report JPEG quality, frame rate and bytes sent per streaming client
+@app.route('/stream_stats')
+def stream_stats_route():
+    return jsonify(stream_stats.report())
+
+# Flask route to report the GPS fix age and reader counters
+@app.route('/gps_status')
+def gps_status():
+    return jsonify(gps.report())
+
+# Flask route to report model load and warm-up times
+@app.route('/model_status')
+def model_status():
+    return jsonify(model_timings())
 
 # Flask route to serve the map
 @app.route('/')
@@ -134,5 +132,6 @@ def index():
     return render_template('index.html', map_html=map_html)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5005, debug=True)
+    # The video stream runs as a coroutine on an asyncio server; Flask's threads only serve the map and status
+    serve(app, [mjpeg_route('/video_feed', broadcaster, stream_stats)], port=5005)
 
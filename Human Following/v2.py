@@ -1,34 +1,39 @@
 from flask import Flask, render_template, Response, request, jsonify
 import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
-import threading
+import time
 import atexit
 import os
+import sys
 import serial  # Import serial for Arduino communication
 
-app = Flask(__name__)
+# Shared modules (frame sources, pipeline, ...) live in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from frame_source import open_source
+from model_registry import load_model, model_timings
+from detections import DetectionBatch, DetectionCache
+from stream_quality import StreamStats
+from frame_broadcaster import FrameBroadcaster
+from video_socket import StreamFrame
+from async_server import serve, mjpeg_route, events_route
+from status_events import StatusChannel
 
-# Define the model path relative to the current working directory
-model_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'yolov8n_ncnn_model')
+app = Flask(__name__)
 
 # Initialize Camera and Model
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
-# Initialize YOLO model with the correct path
-model = YOLO(model_path)
+# Shared YOLO model, found in the repository root and warmed up in the background
+model = load_model("yolov8n_ncnn_model")
 
 # Initialize Arduino for movement control
 arduino = serial.Serial('/dev/ttyACM0', 9600, timeout=1)  # Adjust the port for your Arduino
 
 selected_human = None
 human_class_id = 0  # COCO class ID for 'person'
+detection_cache = DetectionCache()  # Humans detected in the last few streamed frames, for /select_person
+stream_stats = StreamStats()  # Per-client JPEG quality, size and bytes sent
 movement_status = "S"  # Initial movement status: Stop
+status = StatusChannel()  # Pushes movement, target and detection changes to /events
 
 def send_arduino_command(command):
     """Send command to Arduino to control movement."""
@@ -38,64 +43,75 @@ def send_arduino_command(command):
     except Exception as e:
         print(f"Error sending command to Arduino: {e}")
 
-def generate_frames():
+def detect_frame():
+    """Capture and detect one frame, draw the boxes and steer towards the selected person."""
     global selected_human, movement_status
-    while True:
-        frame = picam2.capture_array()
-        results = model(frame, imgsz=320)
-
-        detected_humans = []
-        for result in results[0].boxes:
-            if int(result.cls) == human_class_id:
-                x1, y1, x2, y2 = result.xyxy[0].tolist()
-                detected_humans.append((x1, y1, x2, y2))
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (255, 0, 0), 2)
-
-        # If a person is selected, track their movement
-        if selected_human:
-            x1, y1, x2, y2 = selected_human
-            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-
-            # Update selected human position if the person is found in the frame again
-            person_found = False
-            for box in detected_humans:
-                dx1, dy1, dx2, dy2 = box
-                # Check if the detected person overlaps with the selected human
-                if (x1 < dx2 and x2 > dx1 and y1 < dy2 and y2 > dy1):
-                    selected_human = (dx1, dy1, dx2, dy2)  # Update the selected person
-                    person_found = True
-                    break
-
-            if person_found:
-                # Movement logic (optional)
-                center_x = (x1 + x2) // 2
-                frame_center_x = frame.shape[1] // 2
-                threshold = 50
-
-                if center_x < frame_center_x - threshold:
-                    movement_status = "L"  # Left
-                    send_arduino_command('L')  # Send 'L' command to Arduino
-                elif center_x > frame_center_x + threshold:
-                    movement_status = "R"  # Right
-                    send_arduino_command('R')  # Send 'R' command to Arduino
-                else:
-                    movement_status = "F"  # Forward
-                    send_arduino_command('F')  # Send 'F' command to Arduino
+    frame = picam2.capture_array()
+    results = model(frame, imgsz=320)
+
+    humans = DetectionBatch.from_results(results).only(human_class_id)
+    frame_id = detection_cache.publish(humans)
+    for hx1, hy1, hx2, hy2 in humans.xyxy.astype(int).tolist():
+        cv2.rectangle(frame, (hx1, hy1), (hx2, hy2), (255, 0, 0), 2)
+
+    # If a person is selected, track their movement
+    if selected_human:
+        x1, y1, x2, y2 = selected_human
+        cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
+
+        # Update selected human position if the person is found in the frame again
+        match = humans.overlapping(selected_human)
+        person_found = match is not None
+        if person_found:
+            selected_human = humans.box(match)  # Update the selected person
+
+        if person_found:
+            # Movement logic (optional)
+            center_x = (x1 + x2) // 2
+            frame_center_x = frame.shape[1] // 2
+            threshold = 50
+
+            if center_x < frame_center_x - threshold:
+                movement_status = "L"  # Left
+                send_arduino_command('L')  # Send 'L' command to Arduino
+            elif center_x > frame_center_x + threshold:
+                movement_status = "R"  # Right
+                send_arduino_command('R')  # Send 'R' command to Arduino
             else:
-                # If the person is no longer found in the frame, stop movement
-                movement_status = "S"  # Stop
-                send_arduino_command('S')  # Send 'S' command to Arduino
-                selected_human = None  # Clear the selected human since they are no longer in the frame
+                movement_status = "F"  # Forward
+                send_arduino_command('F')  # Send 'F' command to Arduino
         else:
-            # If no person is selected or person is lost, stop movement
+            # If the person is no longer found in the frame, stop movement
             movement_status = "S"  # Stop
             send_arduino_command('S')  # Send 'S' command to Arduino
-
-        # Encode the frame for streaming
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+            selected_human = None  # Clear the selected human since they are no longer in the frame
+    else:
+        # If no person is selected or person is lost, stop movement
+        movement_status = "S"  # Stop
+        send_arduino_command('S')  # Send 'S' command to Arduino
+
+    # Push the new state to /events listeners; only fields that changed are sent
+    status.update(
+        movement=movement_status,
+        target=[int(v) for v in selected_human] if selected_human else None,
+        detections={"count": len(humans), "boxes": humans.xyxy.astype(int).tolist()},
+    )
+
+    return StreamFrame(frame, {"frame_id": frame_id})
+
+# One loop captures and detects for every viewer (paused while nobody is watching)
+broadcaster = FrameBroadcaster(detect_frame).start()
+
+def generate_frames(stream):
+    for frame in broadcaster.subscribe():
+        jpeg = frame.jpeg(quality=stream.quality, scale=stream.scale)  # Shared with clients on the same level
+        if jpeg is None:
+            continue
+        started = time.monotonic()
         yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+               b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        # Resumed once the chunk is written, so this measures how fast the client takes frames
+        stream.record(len(jpeg), time.monotonic() - started)
 
 
 @app.route('/')
@@ -103,9 +119,25 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/model_status')
+def model_status():
+    """Model load and warm-up times, and whether it is ready yet."""
+    return jsonify(model_timings())
+
+
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Optional ?fps=...&kbps=... set this client's targets; quality and size adapt to its link
+    stream = stream_stats.open("mjpeg", request.args)
+    response = Response(generate_frames(stream), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.call_on_close(lambda: stream_stats.close(stream))
+    return response
+
+
+@app.route('/stream_stats')
+def stream_stats_route():
+    """Quality level, frame rate and bytes sent for every streaming client."""
+    return jsonify(stream_stats.report())
 
 
 @app.route('/select_person', methods=['POST'])
@@ -114,26 +146,19 @@ def select_person():
     data = request.get_json()
     x, y = data['x'], data['y']
     
-    # Capture a frame for detection
-    frame = picam2.capture_array()
-    results = model(frame, imgsz=320)
+    # Hit-test against the detections of the frame the client saw (or the newest one); no new capture or model call
+    frame_id, humans = detection_cache.get(data.get('frame_id'))
+    if humans is None:
+        return jsonify({"status": "No person found"})
+
+    # Check if click is inside a detected human box
+    index = humans.containing(x, y)
+    if index is not None:
+        selected_human = humans.box(index)
+        status.update(target=[int(v) for v in selected_human])
+        return jsonify({"status": "Person selected", "frame_id": frame_id})
     
-    detected_humans = []
-    for result in results[0].boxes:
-        if int(result.cls) == human_class_id:
-            x1, y1, x2, y2 = result.xyxy[0].tolist()
-            detected_humans.append((x1, y1, x2, y2))
-            
-            # Log detected boxes and click position for debugging
-            print(f"Detected box: ({x1}, {y1}), ({x2}, {y2})")
-            print(f"Click position: ({x}, {y})")
-            
-            # Check if click is inside a detected human box
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                selected_human = (x1, y1, x2, y2)
-                return jsonify({"status": "Person selected"})
-    
-    return jsonify({"status": "No person found"})
+    return jsonify({"status": "No person found", "frame_id": frame_id})
 
 
 @app.route('/get_movement', methods=['GET'])
@@ -141,8 +166,15 @@ def get_movement():
     return jsonify({"movement": movement_status})
 
 
+@app.route('/events')
+def events():
+    """Server-sent events: the current status, then every change as it happens."""
+    return Response(status.stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
 def shutdown_cleanup():
     """Close camera connection and Arduino properly on exit."""
+    broadcaster.stop()  # Stop the capture loop before the camera goes away
     if picam2 is not None:
         picam2.stop()  # Stop the Picamera2 camera
         print("? Camera stopped.")
@@ -158,4 +190,8 @@ def shutdown_cleanup():
 atexit.register(shutdown_cleanup)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    # The streams run as coroutines on an asyncio server; Flask's threads only serve short requests
+    serve(app, [
+        mjpeg_route('/video_feed', broadcaster, stream_stats),
+        events_route('/events', status),
+    ], port=5000)
\ No newline at end of file
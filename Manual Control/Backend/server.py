@@ -1,10 +1,18 @@
 from flask import Flask, request, jsonify, send_from_directory, Response
 import os
-import cv2  # OpenCV for frame encoding
-from picamera2 import Picamera2
 import atexit
 import time
 import serial  # Make sure the serial module is imported
+import sys
+import threading
+
+# Shared modules (frame sources, pipeline, ...) live in the repository root
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from frame_source import open_source
+from stream_quality import StreamStats
+from frame_broadcaster import FrameBroadcaster
+from video_socket import StreamFrame
+from async_server import serve, mjpeg_route
  
 app = Flask(__name__)
  
@@ -16,11 +24,16 @@ SCRIPT_FOLDER = os.path.join(FRONTEND_FOLDER, 'script')
 # Initialize serial connection to Arduino
 arduino = None
 camera = None
+# Flask worker threads and the capture loop can all ask for the camera at once; only one may open it
+init_lock = threading.Lock()
+stream_stats = StreamStats()  # Per-client JPEG quality, size and bytes sent
  
 def initialize_serial():
     """Initialize serial connection to Arduino."""
     global arduino
-    if arduino is None:
+    with init_lock:
+        if arduino is not None:
+            return
         try:
             arduino = serial.Serial(port='/dev/ttyACM0', baudrate=9600, timeout=1)
             print("? Arduino connected successfully")
@@ -28,16 +41,15 @@ def initialize_serial():
             print(f"? Failed to connect to Arduino: {e}")
  
 def initialize_camera():
-    """Initialize Picamera2 for streaming."""
+    """Initialize the camera (or the configured replay source) for streaming."""
     global camera
-    if camera is None:
+    with init_lock:
+        if camera is not None:
+            return
         try:
-            camera = Picamera2()
-            
-            config = camera.create_still_configuration(main={"size": (320, 320)})
-            camera.configure(config)
-
-            camera.start()
+            # RGB888 frames are B, G, R in memory, which is what cv2.imencode expects,
+            # so the channel order is settled here once instead of converted every frame
+            camera = open_source(pixel_format="RGB888")
             print("? Camera initialized successfully.")# Use default configuration
         
         except Exception as e:
@@ -97,27 +109,49 @@ def control():
         return jsonify({'error': 'Failed to send command to Arduino'}), 500
  
 # MJPEG video streaming using Picamera2
-def generate_video_feed():
-    """Generates video frames for live streaming."""
+def capture_frame():
+    """Capture one frame for every viewer to share."""
+    if camera is None:
+        initialize_camera()
+        if camera is None:
+            time.sleep(1)  # Try again shortly
+            return None
+    return StreamFrame(camera.capture_array(), {})  # Already in BGR order
+ 
+# One capture loop for every viewer (paused while nobody is watching)
+broadcaster = FrameBroadcaster(capture_frame).start()
+ 
+def generate_video_feed(stream):
+    """Generates video frames for live streaming, at the quality and size the client's link keeps up with."""
     try:
-        while True:
-            frame = camera.capture_array()  # Capture a frame in RGB
-            frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)  # Convert RGB to BGR
-            _, buffer = cv2.imencode('.jpg', frame_bgr)  # Convert to JPEG
-            frame_data = buffer.tobytes()
+        for frame in broadcaster.subscribe():
+            frame_data = frame.jpeg(quality=stream.quality, scale=stream.scale)  # Convert to JPEG (shared per level)
+            if frame_data is None:
+                continue
+            started = time.monotonic()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_data + b'\r\n')
+            stream.record(len(frame_data), time.monotonic() - started)  # Time the client took to accept it
     except Exception as e:
         print(f"? Error capturing video: {e}")
  
 @app.route('/video_feed')
 def video_feed():
-    """Video feed endpoint."""
-    return Response(generate_video_feed(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    """Video feed endpoint; optional ?fps=...&kbps=... set this client's targets."""
+    stream = stream_stats.open("mjpeg", request.args)
+    response = Response(generate_video_feed(stream), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.call_on_close(lambda: stream_stats.close(stream))
+    return response
+ 
+@app.route('/stream_stats')
+def stream_stats_route():
+    """Quality level, frame rate and bytes sent for every streaming client."""
+    return jsonify(stream_stats.report())
  
 # Graceful Shutdown Cleanup
 def shutdown_cleanup():
     """Close camera connection properly on exit."""
+    broadcaster.stop()  # Stop the capture loop before the camera goes away
     if camera is not None:
         camera.stop()
         print("? Camera stopped.")
@@ -125,4 +159,9 @@ def shutdown_cleanup():
 atexit.register(shutdown_cleanup)
  
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
\ No newline at end of file
+    # Open the hardware once before serving; the ASGI /video_feed route never goes through before_request
+    initialize_serial()
+    initialize_camera()
+    # The video stream runs as a coroutine on an asyncio server, so /control commands
+    # get a free worker thread (and a fast answer) however many viewers are connected
+    serve(app, [mjpeg_route('/video_feed', broadcaster, stream_stats)], port=5000)
\ No newline at end of file
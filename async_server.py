@@ -0,0 +1,81 @@
+"""Serve a Flask app behind an asyncio (ASGI) server that handles the long-lived streams itself.
+
+The Flask development server ties up one thread per open MJPEG response, so a
+few viewers are enough to starve the control routes. Here each stream is a
+coroutine fed by a FrameBroadcaster (capture and inference stay on the
+broadcaster's own thread), and only ordinary requests such as /control or
+/select_person go to the Flask app, on a small pool of worker threads that
+streams never occupy.
+
+    routes = [mjpeg_route('/video_feed', broadcaster, stream_stats)]
+    serve(app, routes, port=5000)
+
+Needs uvicorn, starlette and a2wsgi (pip install -r requirements.txt).
+"""
+import asyncio
+import time
+
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+
+from video_socket import stream_to_socket
+
+WSGI_THREADS = 8  # Worker threads for the Flask routes
+
+
+def mjpeg_route(path, broadcaster, stats, annotated=False):
+    """An MJPEG stream of the broadcaster's StreamFrames, at each client's own quality level."""
+
+    async def endpoint(request):
+        # Optional ?fps=...&kbps=... set this client's targets
+        stream = stats.open("mjpeg", request.query_params)
+        loop = asyncio.get_running_loop()
+
+        async def body():
+            try:
+                async for frame in broadcaster.subscribe_async():
+                    jpeg = await loop.run_in_executor(None, frame.jpeg, annotated, stream.quality, stream.scale)
+                    if jpeg is None:
+                        continue
+                    started = time.monotonic()
+                    yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n'
+                    # Resumed once the chunk has been handed to a transport with room, so this times the send
+                    stream.record(len(jpeg), time.monotonic() - started)
+            finally:
+                stats.close(stream)
+
+        return StreamingResponse(body(), media_type='multipart/x-mixed-replace; boundary=frame')
+
+    return Route(path, endpoint)
+
+
+def events_route(path, channel):
+    """Server-sent events from a StatusChannel."""
+
+    async def endpoint(request):
+        return StreamingResponse(channel.stream_async(), media_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache'})
+
+    return Route(path, endpoint)
+
+
+def socket_route(path, broadcaster, stats):
+    """The WebSocket video channel (see video_socket.stream_to_socket)."""
+
+    async def endpoint(websocket):
+        stream = stats.open("ws", websocket.query_params)
+        try:
+            await stream_to_socket(websocket, broadcaster, stream)
+        finally:
+            stats.close(stream)
+
+    return WebSocketRoute(path, endpoint)
+
+
+def serve(app, routes, host="0.0.0.0", port=5000, wsgi_threads=WSGI_THREADS):
+    """Run the streaming routes as coroutines and everything else through the Flask app."""
+    asgi_app = Starlette(routes=list(routes) + [Mount("/", app=WSGIMiddleware(app, workers=wsgi_threads))])
+    uvicorn.run(asgi_app, host=host, port=port, log_level="warning")
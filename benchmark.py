@@ -0,0 +1,231 @@
+"""Replay a fixed set of frames through the detection loop and report per-stage latency.
+
+Examples:
+    python benchmark.py --source video:drive.mp4 --frames 300 --json results.json
+    python benchmark.py --source synthetic --model YOLOv8_Small_RDD_ncnn_model --pipelined
+
+Every frame goes through capture (copy into the frame ring), the model
+(preprocess / inference / postprocess as timed by ultralytics, plus the wall time
+of the whole call), annotation, JPEG encoding and optionally display. The report
+gives p50/p95/p99 per stage and the end-to-end FPS. Use --json to save it so runs
+can be compared across commits and models. --overlay also times the overlay
+renderer against results[0].plot() on the same detections.
+"""
+import argparse
+import contextlib
+import json
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from frame_ring import FrameRing
+from frame_source import EndOfStream, ReplaySource, open_source
+from metrics import StageTimes
+from model_registry import load_model, model_timings
+from overlay import OverlayRenderer
+from pipeline import DetectionPipeline, draw_detections
+
+
+class MemorySource(ReplaySource):
+    """Replays preloaded frames, so decoding the recording isn't part of the measurement."""
+
+    def __init__(self, frames, repeat=1, fps=None):
+        height, width = frames[0].shape[:2]
+        # With an fps the frames arrive at camera pace, otherwise as fast as they are asked for
+        super().__init__((width, height), fps=fps, pace="realtime" if fps else "fast")
+        self.frames = frames
+        self.total = len(frames) * repeat
+        self._index = 0
+
+    def read(self):
+        if self._index >= self.total:
+            return None
+        frame = self.frames[self._index % len(self.frames)]
+        self._index += 1
+        return frame
+
+    def rewind(self):
+        self._index = 0
+
+
+def load_frames(spec, count):
+    """Read up to count frames from the source described by spec."""
+    source = open_source(spec, pace="fast")
+    frames = []
+    try:
+        for frame in source:
+            frames.append(frame.copy())
+            if len(frames) >= count:
+                break
+    finally:
+        source.stop()
+    if not frames:
+        sys.exit(f"No frames could be read from {spec}")
+    return frames
+
+
+def run_sequential(model, frames, repeat, model_kwargs, show):
+    """Time each stage of the detection loop for every frame, one frame at a time."""
+    source = MemorySource(frames, repeat)
+    ring = FrameRing(source.shape, slots=1)
+    times = StageTimes()
+
+    start = time.perf_counter()
+    processed = 0
+    while True:
+        frame_start = time.perf_counter()
+        try:
+            slot, frame = ring.capture(source)
+        except EndOfStream:
+            break
+        times.add("capture", (time.perf_counter() - frame_start) * 1000)
+
+        with times.time("model_total"):
+            results = model(frame, **model_kwargs)
+        for stage, ms in results[0].speed.items():
+            times.add(stage, ms)  # preprocess / inference / postprocess as timed by ultralytics
+
+        with times.time("annotate"):
+            draw_detections(frame, results)
+        with times.time("encode"):
+            cv2.imencode('.jpg', frame)
+        if show:
+            with times.time("display"):
+                cv2.imshow("Benchmark", frame)
+                cv2.waitKey(1)
+
+        ring.release(slot)
+        times.add("end_to_end", (time.perf_counter() - frame_start) * 1000)
+        processed += 1
+
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": processed,
+        "seconds": round(elapsed, 3),
+        "fps": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": times.summary(),
+        "copies_per_frame": round(ring.copies_per_frame, 3),
+    }
+
+
+def run_pipelined(model, frames, repeat, model_kwargs, camera_fps):
+    """Feed the frames at camera pace through the threaded DetectionPipeline and measure what comes out."""
+    ages = StageTimes()
+
+    def handle_results(frame, results):
+        ages.add("frame_age", (time.monotonic() - frame.captured_at) * 1000)
+
+    source = MemorySource(frames, repeat, fps=camera_fps)
+    pipeline = DetectionPipeline(source, model, handle_results=handle_results, model_kwargs=model_kwargs,
+                                 show=False, report_on_exit=False)
+    start = time.perf_counter()
+    pipeline.run()
+    elapsed = time.perf_counter() - start
+    output = pipeline.stats["output"]
+    return {
+        "captured": pipeline.stats["captured"],
+        "output": output,
+        "seconds": round(elapsed, 3),
+        "fps": round(output / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": ages.summary(),
+    }
+
+
+def compare_overlays(model, frames, model_kwargs):
+    """Time results[0].plot() against OverlayRenderer (drawing, and metadata only) on the same detections."""
+    times = StageTimes()
+    overlay = OverlayRenderer()
+    metadata_only = OverlayRenderer(burn_in=False)
+    for frame in frames:
+        results = model(frame, **model_kwargs)
+        with times.time("plot"):
+            results[0].plot()
+        scratch = frame.copy()  # The renderer draws in place; keep the source frames clean
+        with times.time("overlay"):
+            overlay.render(scratch, results)
+        with times.time("metadata_only"):
+            metadata_only.render(scratch, results)
+    return {"frames": len(frames), "stages": times.summary()}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(report):
+    print(f"Model: {report['model']}  Source: {report['source']}  Commit: {report['commit']}")
+    for mode in ("sequential", "pipelined", "overlay"):
+        if mode not in report:
+            continue
+        result = report[mode]
+        if mode == "overlay":
+            print(f"\noverlay: cost of drawing the detections of {result['frames']} frames")
+        else:
+            print(f"\n{mode}: {result['fps']} FPS end to end over {result['seconds']} s")
+        print(f"  {'stage':<14}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+        for stage, stat in result["stages"].items():
+            print(f"  {stage:<14}{stat['p50']:>9}{stat['p95']:>9}{stat['p99']:>9}{stat['max']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency benchmark for the detection loop")
+    parser.add_argument("--source", default="synthetic", help="frame source spec (see frame_source.py)")
+    parser.add_argument("--model", default="yolov8n_ncnn_model", help="model to load")
+    parser.add_argument("--frames", type=int, default=200, help="number of frames to load from the source")
+    parser.add_argument("--repeat", type=int, default=1, help="replay the frame set this many times")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed inference passes before measuring")
+    parser.add_argument("--imgsz", type=int, default=None, help="inference size passed to the model")
+    parser.add_argument("--pipelined", action="store_true", help="also measure the threaded pipeline")
+    parser.add_argument("--camera-fps", type=float, default=30.0,
+                        help="rate frames are fed to the pipelined run, like a live camera")
+    parser.add_argument("--overlay", action="store_true", help="also compare the overlay renderer with plot()")
+    parser.add_argument("--show", action="store_true", help="include cv2.imshow in the timed loop")
+    parser.add_argument("--json", help="write the report as JSON to this file ('-' for stdout)")
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.frames)
+    # Keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr if args.json == "-" else sys.stdout):
+        model = load_model(args.model, background=False)
+    model_kwargs = {"verbose": False}
+    if args.imgsz:
+        model_kwargs["imgsz"] = args.imgsz
+
+    # Warm up so the first slow inference doesn't skew the percentiles
+    for _ in range(args.warmup):
+        model(frames[0], **model_kwargs)
+
+    report = {
+        "model": args.model,
+        "source": args.source,
+        "commit": git_commit(),
+        "frame_shape": list(np.shape(frames[0])),
+        "model_timings": model_timings().get(args.model),
+        "sequential": run_sequential(model, frames, args.repeat, model_kwargs, args.show),
+    }
+    if args.pipelined:
+        report["pipelined"] = run_pipelined(model, frames, args.repeat, model_kwargs, args.camera_fps)
+    if args.overlay:
+        report["overlay"] = compare_overlays(model, frames, model_kwargs)
+    if args.show:
+        cv2.destroyAllWindows()
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"\nSaved report to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class BatchWriter:
+    """Inserts rows from a background thread, many per round-trip and commit.
+
+    put() only appends the row to a bounded queue, so the detection loop never
+    waits on MySQL. The writer thread takes up to batch_size rows, inserts them
+    with one executemany() and commits once; it writes as soon as batch_size
+    rows are waiting, or after flush_interval seconds for whatever is there.
+
+    When the database falls behind and the queue is full, policy decides:
+    "drop_oldest" discards the oldest queued row (the default: the newest
+    detections are kept), "drop_newest" refuses the new one, and "block" waits
+    up to block_timeout_s for room (backpressure that slows the caller by a
+    bounded amount) before refusing it. A batch that fails is retried
+    max_retries times and then dropped.
+    """
+
+    POLICIES = ("drop_oldest", "drop_newest", "block")
+
+    def __init__(self, db, query, name="db", batch_size=50, flush_interval=1.0, max_queue=5000,
+                 policy="drop_oldest", block_timeout_s=0.05, max_retries=3):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown policy {policy!r}, expected one of {self.POLICIES}")
+        self.db = db  # Only ever used from the writer thread once started
+        self.query = query  # INSERT with one placeholder per row field
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.policy = policy
+        self.block_timeout_s = block_timeout_s
+        self.max_retries = max_retries
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # Counters for checking the database keeps up
+        self.queued = 0
+        self.written = 0
+        self.dropped = 0  # Rows lost to a full queue
+        self.failed = 0  # Rows in batches that kept failing
+        self.batches = 0
+        self.max_depth = 0
+        self._commit_ms = deque(maxlen=500)  # Recent executemany + commit times
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, row):
+        """Queue one row; returns False if it was dropped because the queue is full."""
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                if self.policy == "block":
+                    self._cond.wait_for(lambda: len(self._queue) < self.max_queue, self.block_timeout_s)
+                if len(self._queue) >= self.max_queue:
+                    self.dropped += 1
+                    if self.policy != "drop_oldest":
+                        return False
+                    self._queue.popleft()
+            self._queue.append(row)
+            self.queued += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _take(self):
+        """Wait for a full batch (or the flush interval, or stop) and take up to batch_size rows."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._queue) >= self.batch_size or not self._running,
+                                self.flush_interval)
+            count = min(len(self._queue), self.batch_size)
+            rows = [self._queue.popleft() for _ in range(count)]
+            if rows:
+                self._cond.notify_all()  # Room for a blocked put()
+            return rows
+
+    def _run(self):
+        cursor = self.db.cursor()
+        while True:
+            rows = self._take()
+            if not rows:
+                if not self._running:
+                    break
+                continue
+            self._write(cursor, rows)
+        cursor.close()
+
+    def _write(self, cursor, rows):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                cursor.executemany(self.query, rows)
+                self.db.commit()
+            except Exception as e:
+                print(f"Error saving {len(rows)} rows to {self.name} (attempt {attempt + 1}): {e}")
+                try:
+                    self.db.rollback()
+                except Exception:
+                    pass
+                if not self._running:
+                    break  # Shutting down: don't hold up the exit retrying
+                time.sleep(min(2 ** attempt, 10))
+                continue
+            self._commit_ms.append((time.perf_counter() - started) * 1000)
+            self.written += len(rows)
+            self.batches += 1
+            return
+        self.failed += len(rows)
+
+    def stop(self, timeout=10.0):
+        """Write whatever is still queued, then stop the writer thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def report(self):
+        with self._cond:
+            depth = len(self._queue)
+        commit_ms = np.asarray(self._commit_ms, dtype=np.float64)
+        report = {
+            "queue_depth": depth,
+            "max_depth": self.max_depth,
+            "queued": self.queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "rows_per_batch": round(self.written / self.batches, 1) if self.batches else 0.0,
+        }
+        if commit_ms.size:
+            p50, p95 = np.percentile(commit_ms, [50, 95])
+            report.update(commit_ms_p50=round(float(p50), 2), commit_ms_p95=round(float(p95), 2),
+                          commit_ms_max=round(float(commit_ms.max()), 2))
+        return report
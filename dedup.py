@@ -0,0 +1,301 @@
+import math
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from gps_reader import EARTH_M_PER_DEG
+
+# Extra columns written with STORE_EVENT_DETAILS; add them to an existing table with e.g.
+#   ALTER TABLE detected_road_conditions ADD first_seen DATETIME(3), ADD last_seen DATETIME(3),
+#       ADD confidence FLOAT, ADD hits INT;
+DETAIL_COLUMNS = ("first_seen", "last_seen", "confidence", "hits")
+
+
+def event_insert(table, details=False, placeholder="%s"):
+    """INSERT statement for DetectionEvent.row(details) into table."""
+    columns = ("name", "latitude", "longitude") + (DETAIL_COLUMNS if details else ())
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+
+
+class DetectionEvent(namedtuple("DetectionEvent", "name latitude longitude first_seen last_seen confidence hits")):
+    """One object seen over consecutive frames: where (at its last sighting), when, how sure, how often.
+
+    first_seen and last_seen are in the clock the frames were stamped with
+    (time.monotonic() for CapturedFrame.captured_at).
+    """
+
+    __slots__ = ()
+
+    def row(self, details=False):
+        """Database row: (name, latitude, longitude), plus the DETAIL_COLUMNS with details."""
+        if not details:
+            return self.name, self.latitude, self.longitude
+        to_wall = time.time() - time.monotonic()
+        return (self.name, self.latitude, self.longitude,
+                datetime.fromtimestamp(self.first_seen + to_wall), datetime.fromtimestamp(self.last_seen + to_wall),
+                round(self.confidence, 3), self.hits)
+
+
+class GroundProjection:
+    """Where the bottom centre of a box lies on a flat road, relative to the camera.
+
+    camera_height_m is the lens height above the road, horizon the row of the
+    horizon as a fraction of the frame height (0 top, 1 bottom; tilting the
+    camera down moves it up) and vfov_deg/hfov_deg the field of view (62.2 x
+    48.8 for the Pi Camera Module 2). Calling it with a box and the frame shape
+    returns (ahead_m, right_m), or None for a box that does not touch the road
+    within max_ahead_m.
+    """
+
+    def __init__(self, camera_height_m=1.2, horizon=0.4, vfov_deg=48.8, hfov_deg=62.2, max_ahead_m=40.0):
+        self.camera_height_m = camera_height_m
+        self.horizon = horizon
+        self.vfov = math.radians(vfov_deg)
+        self.half_width = math.tan(math.radians(hfov_deg) / 2)
+        self.max_ahead_m = max_ahead_m
+
+    def __call__(self, box, shape):
+        height, width = shape[:2]
+        x1, _, x2, y2 = box
+        below = (y2 / height - self.horizon) * self.vfov  # Angle below the horizon of the box's bottom edge
+        if below <= 0:
+            return None
+        ahead = self.camera_height_m / math.tan(below)
+        if ahead > self.max_ahead_m:
+            return None
+        right = ahead * ((x1 + x2) / width - 1.0) * self.half_width
+        return ahead, right
+
+
+class _Track:
+    __slots__ = ("class_id", "box", "first_seen", "last_seen", "confidence", "hits", "position", "ground",
+                 "travelled")
+
+    def __init__(self, class_id, box, at, confidence, position, ground, travelled):
+        self.class_id = class_id
+        self.box = box
+        self.first_seen = at
+        self.last_seen = at
+        self.confidence = confidence
+        self.hits = 1
+        self.position = position
+        self.ground = ground  # Estimated (x, y) of the object on the road, in metres; None if unknown
+        self.travelled = travelled  # Distance driven (the deduplicator's odometer) at the last sighting
+
+
+def _iou(boxes_a, boxes_b):
+    """IoU of every box in boxes_a (N, 4) against every box in boxes_b (M, 4), as (N, M)."""
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def _pair_greedy(cost, max_cost):
+    """Greedy one-to-one (row, column) pairs from a cost matrix, cheapest first, up to max_cost."""
+    cost = np.array(cost, dtype=np.float64)
+    pairs = []
+    while cost.size:
+        row, col = np.unravel_index(np.argmin(cost), cost.shape)
+        if cost[row, col] > max_cost:
+            break
+        pairs.append((row, col))
+        cost[row, :] = np.inf  # Each track and each box is matched at most once
+        cost[:, col] = np.inf
+    return pairs
+
+
+class DetectionDeduplicator:
+    """Merges the detections of one object over consecutive frames into a single DetectionEvent.
+
+    A pothole in view for two seconds is detected in some 30 frames; storing
+    every box gives 30 rows at nearly the same spot. Each frame's boxes are
+    matched to the open tracks of the same class by overlap with the track's
+    last box (greedy, best IoU first, at least iou_threshold); unmatched boxes
+    start new tracks. A track closes once it has not been seen for max_age_s,
+    and only then becomes an event, located where the vehicle was at the last
+    sighting (when a road object leaves the bottom of the frame the car is
+    nearly on top of it). Tracks with fewer than min_hits sightings are
+    discarded as flicker.
+
+    Frames far apart in space (survey mode runs the model every few metres)
+    rarely overlap by IoU. With match_distance_m and a projection (e.g.
+    GroundProjection) each box is also placed on the road from the GPS
+    position and direction of travel, and a box that overlaps no track joins
+    the nearest open track of its class within match_distance_m. Such a track
+    stays open until the vehicle has driven max_gap_m past its last sighting
+    (or max_idle_s has passed, e.g. while parked), however long the gap between
+    inferred frames. Call expire() on frames that were not inferred, so tracks
+    still close while the model is idle.
+    """
+
+    MIN_STEP_M = 0.5  # Smaller position changes are GPS noise, not travel
+    HEADING_BASELINE_M = 10.0  # The direction of travel is taken over at least this distance, to average out noise
+
+    def __init__(self, names, iou_threshold=0.2, max_age_s=1.0, min_hits=1, match_distance_m=None,
+                 projection=None, max_gap_m=10.0, max_idle_s=10.0):
+        self.names = names  # {class_id: name} of the classes to track; other classes are ignored
+        self.iou_threshold = iou_threshold
+        self.max_age_s = max_age_s
+        self.min_hits = min_hits
+        self.match_distance_m = match_distance_m  # None matches by image overlap only
+        self.projection = projection  # callable(box, frame shape) -> (ahead_m, right_m) or None
+        self.max_gap_m = max_gap_m
+        self.max_idle_s = max_idle_s
+        self._tracks = []
+
+        # Where the vehicle is, in metres east and north of the first position seen
+        self._origin = None
+        self._here = None
+        self._trail = deque(maxlen=64)  # Recent positions, for the direction of travel
+        self._direction = None  # Unit vector of the direction of travel
+        self._odometer = 0.0
+
+        self.detections = 0  # Boxes seen (the rows storing every box would have written)
+        self.events = 0
+        self.discarded = 0  # Tracks closed below min_hits
+        self.distance_matches = 0  # Sightings joined to a track by position rather than overlap
+
+    def _move(self, position):
+        """Advance the vehicle to a new (lat, lon)."""
+        if position is None:
+            return
+        lat, lon = position
+        if self._origin is None:
+            self._origin = (lat, lon, EARTH_M_PER_DEG * math.cos(math.radians(lat)))
+        lat0, lon0, m_per_deg_lon = self._origin
+        here = ((lon - lon0) * m_per_deg_lon, (lat - lat0) * EARTH_M_PER_DEG)
+        if self._here is None:
+            self._here = here
+            self._trail.append(here)
+            return
+        step = math.hypot(here[0] - self._here[0], here[1] - self._here[1])
+        if step < self.MIN_STEP_M:
+            return
+        self._odometer += step
+        self._here = here
+        self._trail.append(here)
+        # Direction from the newest position at least HEADING_BASELINE_M back (or the oldest one kept)
+        for x, y in reversed(self._trail):
+            dx, dy = here[0] - x, here[1] - y
+            baseline = math.hypot(dx, dy)
+            if baseline >= self.HEADING_BASELINE_M:
+                break
+        if baseline >= self.MIN_STEP_M:
+            self._direction = (dx / baseline, dy / baseline)
+
+    def _ground(self, box, shape):
+        """Estimated (x, y) of a box on the road, or None without a projection, position or direction."""
+        if self.projection is None or shape is None or self._direction is None:
+            return None
+        offset = self.projection(box, shape)
+        if offset is None:
+            return None
+        ahead, right = offset
+        (x, y), (ux, uy) = self._here, self._direction
+        return x + ahead * ux + right * uy, y + ahead * uy - right * ux  # Right of travel is (uy, -ux)
+
+    def update(self, detections, at, position=None, shape=None):
+        """Add one frame's DetectionBatch captured at time at; returns the events of tracks that closed.
+
+        position is the vehicle's (lat, lon) at that time and shape the frame's
+        shape, both needed for matching by distance.
+        """
+        closed = self.expire(at, position)
+        classes = detections.classes
+        for class_id in self.names:
+            found = np.flatnonzero(classes == class_id)
+            if not found.size:
+                continue
+            boxes = detections.xyxy[found]
+            scores = detections.scores[found]
+            self.detections += int(found.size)
+            tracks = [track for track in self._tracks if track.class_id == class_id]
+            grounds = [self._ground(box, shape) if self.match_distance_m else None for box in boxes.tolist()]
+            free_tracks = set(range(len(tracks)))
+            free_boxes = set(range(found.size))
+            if tracks:
+                iou = _iou(np.stack([track.box for track in tracks]), boxes)
+                for t, d in _pair_greedy(-iou, -self.iou_threshold):
+                    self._extend(tracks[t], boxes[d], at, float(scores[d]), position, grounds[d])
+                    free_tracks.discard(t)
+                    free_boxes.discard(d)
+            # Boxes that overlap no track: join the nearest track on the road, if close enough
+            candidates = [t for t in sorted(free_tracks) if tracks[t].ground is not None]
+            placed = [d for d in sorted(free_boxes) if grounds[d] is not None]
+            if candidates and placed:
+                track_xy = np.array([tracks[t].ground for t in candidates])
+                box_xy = np.array([grounds[d] for d in placed])
+                distance = np.hypot(*(track_xy[:, None, :] - box_xy[None, :, :]).transpose(2, 0, 1))
+                for t, d in _pair_greedy(distance, self.match_distance_m):
+                    t, d = candidates[t], placed[d]
+                    self._extend(tracks[t], boxes[d], at, float(scores[d]), position, grounds[d])
+                    self.distance_matches += 1
+                    free_boxes.discard(d)
+            for d in sorted(free_boxes):
+                self._tracks.append(_Track(class_id, boxes[d], at, float(scores[d]), position, grounds[d],
+                                           self._odometer))
+        return closed
+
+    def _extend(self, track, box, at, confidence, position, ground):
+        track.box = box
+        track.last_seen = at
+        track.confidence = max(track.confidence, confidence)
+        track.hits += 1
+        track.travelled = self._odometer
+        if position is not None:
+            track.position = position
+        if ground is not None:
+            track.ground = ground  # The nearest sighting places it best
+
+    def _expired(self, track, at):
+        idle = at - track.last_seen
+        if idle <= self.max_age_s:
+            return False
+        if track.ground is None:
+            return True
+        # Placed on the road: it can still be matched until the vehicle has driven past it
+        return self._odometer - track.travelled > self.max_gap_m or idle > self.max_idle_s
+
+    def expire(self, at, position=None):
+        """Close the tracks that can no longer be matched at time at (e.g. on a frame that was not inferred)."""
+        self._move(position)
+        return self._close(lambda track: self._expired(track, at))
+
+    def _close(self, done):
+        """Remove the tracks for which done(track) is true and return their events."""
+        events = []
+        still_open = []
+        for track in self._tracks:
+            if not done(track):
+                still_open.append(track)
+            elif track.hits < self.min_hits:
+                self.discarded += 1
+            else:
+                latitude, longitude = track.position if track.position is not None else (None, None)
+                events.append(DetectionEvent(self.names[track.class_id], latitude, longitude, track.first_seen,
+                                             track.last_seen, track.confidence, track.hits))
+        self._tracks = still_open
+        self.events += len(events)
+        return events
+
+    def flush(self):
+        """Close every open track (e.g. at shutdown) and return their events."""
+        return self._close(lambda track: True)
+
+    def report(self):
+        return {
+            "detections": self.detections,
+            "events": self.events,
+            "open_tracks": len(self._tracks),
+            "discarded": self.discarded,
+            "distance_matches": self.distance_matches,
+            # Rows written per-box vs per-event, e.g. 30.0 means one row now stands for 30
+            "reduction": round(self.detections / self.events, 1) if self.events else None,
+        }
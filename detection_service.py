@@ -0,0 +1,112 @@
+import atexit
+import time
+
+import mysql.connector
+
+from frame_source import open_source
+from model_registry import load_model
+from multi_model import ModelTask, MultiModelScheduler
+from roi import RoadRegionModel, CAPTURE_SIZE
+from detections import DetectionBatch
+from gps_reader import open_gps_reader
+from db_writer import BatchWriter
+from dedup import DetectionDeduplicator, GroundProjection, event_insert
+
+# One service owns the camera and the GPS and runs both detectors on the same frames
+# (instead of save_db.py and road_with_gps.py fighting over the hardware).
+PEOPLE_RATE_HZ = 10  # yolov8n people detection
+ROAD_RATE_HZ = 3  # RDD cracks and potholes
+CPU_TARGET = 0.8  # Keep the inference thread at most 80% busy; all rates scale down together beyond that
+REPORT_EVERY_S = 10
+CAMERA_HEIGHT_M = 1.2  # Above the road, for placing road damage on the road (adjust to your mount)
+ROAD_CLASSES = {0: "Crack", 1: "Potholes"}
+
+# Set up the camera with Picam
+picam2 = open_source(size=CAPTURE_SIZE)  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
+
+# Load both models in the background
+people_model = load_model("yolov8n_ncnn_model")
+road_model = RoadRegionModel.from_env(load_model("YOLOv8_Small_RDD_ncnn_model"))  # Same road region as road_with_gps.py
+
+# Set up MySQL database connections (people and road conditions live in separate databases)
+people_db = mysql.connector.connect(host="localhost", user="hasin", password="12345678", database="data")
+road_db = mysql.connector.connect(host="localhost", user="hasin", password="12345678", database="road")
+
+# Also store first/last seen, best confidence and hits per object (needs those columns, see dedup.py)
+STORE_EVENT_DETAILS = False
+
+# Each database gets its own batched writer thread, so neither model waits on MySQL
+people_writer = BatchWriter(people_db, event_insert("detected_people", STORE_EVENT_DETAILS),
+                            name="detected_people").start()
+road_writer = BatchWriter(road_db, event_insert("detected_road_conditions", STORE_EVENT_DETAILS),
+                          name="detected_road_conditions").start()
+
+# Objects stay in view for many frames: each one is stored once, when it is out of view.
+# Road frames can be metres apart at speed, so road damage is also matched by where it is on the road.
+people_dedup = DetectionDeduplicator({0: "Person"})  # Class 0 is "person" in COCO
+road_dedup = DetectionDeduplicator(ROAD_CLASSES, match_distance_m=4.0,
+                                   projection=GroundProjection(camera_height_m=CAMERA_HEIGHT_M))
+
+# GPS Serial port setup
+gps_port = "/dev/serial0"  # Replace with the correct port for your GPS (GPS_PORT overrides it, e.g. a replay)
+
+# Past the newest fix, positions are extrapolated from its speed and heading for at most this many seconds
+MAX_EXTRAPOLATE_S = 1.5
+
+
+def store_events(writer, events):
+    """Queue merged detections (dedup.DetectionEvent) for a database writer thread."""
+    for event in events:
+        if event.latitude is not None:  # Seen only while there was no GPS position
+            writer.put(event.row(STORE_EVENT_DETAILS))
+
+
+def handle_people(frame, results):
+    """Track every person detected in the frame and store the ones that went out of view."""
+    people = DetectionBatch.from_results(results).only(0)
+    position = gps.position_at(frame.captured_at)  # Where we were when the frame was captured
+    store_events(people_writer, people_dedup.update(people, frame.captured_at, position))
+
+
+def handle_road(frame, results):
+    """Track every crack or pothole detected in the frame and store the ones that went out of view."""
+    damage = DetectionBatch.from_results(results).only(*ROAD_CLASSES)
+    position = gps.position_at(frame.captured_at)
+    store_events(road_writer, road_dedup.update(damage, frame.captured_at, position, frame.image.shape))
+
+
+# Read the GPS in a separate thread, draining every sentence as it arrives
+gps = open_gps_reader(gps_port, max_extrapolate_s=MAX_EXTRAPOLATE_S).start()
+atexit.register(gps.stop)  # Stops the reader and closes a GPS_LOG recording however we exit
+
+scheduler = MultiModelScheduler(picam2, [
+    ModelTask("people", people_model, PEOPLE_RATE_HZ, handle_people),
+    ModelTask("road", road_model, ROAD_RATE_HZ, handle_road),
+], cpu_target=CPU_TARGET).start()
+
+try:
+    while scheduler.running:
+        time.sleep(REPORT_EVERY_S)
+        print(f"Scheduler: {scheduler.report()}")
+        print(f"GPS: {gps.report()}")
+        print(f"Database writers: people {people_writer.report()}, road {road_writer.report()}")
+        print(f"Deduplication: people {people_dedup.report()}, road {road_dedup.report()}")
+except KeyboardInterrupt:
+    pass
+
+# Clean up
+scheduler.stop()
+print(f"Scheduler: {scheduler.report()}")
+print(f"GPS: {gps.report()}")
+picam2.stop()
+store_events(people_writer, people_dedup.flush())  # Objects still in view at the end
+store_events(road_writer, road_dedup.flush())
+for name, dedup in (("people", people_dedup), ("road", road_dedup)):
+    report = dedup.report()
+    print(f"Deduplication ({name}): {report['detections']} detections stored as {report['events']} rows "
+          f"({report['reduction']}x fewer), {report}")
+people_writer.stop()  # Write whatever is still queued
+road_writer.stop()
+print(f"Database writers: people {people_writer.report()}, road {road_writer.report()}")
+people_db.close()
+road_db.close()
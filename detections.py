@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class DetectionBatch:
+    """All detections of one frame as flat NumPy arrays.
+
+    Pulling boxes, classes and scores out of the results in one go and working
+    on whole arrays avoids the per-box tensor access (int(obj.cls[0]),
+    obj.xyxy[0].tolist(), conf[0].item()) that dominates post-processing when a
+    frame has many boxes.
+    """
+
+    __slots__ = ("xyxy", "classes", "scores", "names")
+
+    def __init__(self, xyxy, classes, scores, names=None):
+        self.xyxy = xyxy  # (N, 4) float32: x1, y1, x2, y2
+        self.classes = classes  # (N,) int32
+        self.scores = scores  # (N,) float32
+        self.names = names or {}
+
+    @classmethod
+    def empty(cls, names=None):
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.int32), np.zeros(0, np.float32), names)
+
+    @classmethod
+    def from_results(cls, results):
+        """Build a batch from ultralytics results (the list returned by model(frame))."""
+        result = results[0]
+        data = result.boxes.data
+        if hasattr(data, "cpu"):
+            data = data.cpu().numpy()  # One transfer for the whole frame
+        data = np.asarray(data, dtype=np.float32)
+        if not len(data):
+            return cls.empty(result.names)
+        # Columns are x1, y1, x2, y2, (track id,) confidence, class
+        return cls(data[:, :4], data[:, -1].astype(np.int32), data[:, -2], result.names)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _take(self, mask):
+        return DetectionBatch(self.xyxy[mask], self.classes[mask], self.scores[mask], self.names)
+
+    def only(self, *class_ids):
+        """Keep only detections of the given class ids."""
+        if len(class_ids) == 1:
+            return self._take(self.classes == class_ids[0])
+        return self._take(np.isin(self.classes, class_ids))
+
+    def above(self, min_score):
+        """Keep only detections with at least min_score confidence."""
+        return self._take(self.scores >= min_score)
+
+    def areas(self):
+        return (self.xyxy[:, 2] - self.xyxy[:, 0]) * (self.xyxy[:, 3] - self.xyxy[:, 1])
+
+    def centers(self):
+        """(N, 2) array of box centres."""
+        return np.stack(((self.xyxy[:, 0] + self.xyxy[:, 2]) / 2, (self.xyxy[:, 1] + self.xyxy[:, 3]) / 2), axis=1)
+
+    def largest(self):
+        """Index of the biggest box (the closest object), or None if there are none."""
+        if not len(self):
+            return None
+        return int(np.argmax(self.areas()))
+
+    def containing(self, x, y):
+        """Index of the smallest box containing the point (x, y), or None."""
+        x1, y1, x2, y2 = self.xyxy.T
+        hits = np.flatnonzero((x1 <= x) & (x <= x2) & (y1 <= y) & (y <= y2))
+        if not hits.size:
+            return None
+        return int(hits[np.argmin(self.areas()[hits])])
+
+    def overlapping(self, box):
+        """Index of the first box overlapping box (x1, y1, x2, y2), or None."""
+        bx1, by1, bx2, by2 = box
+        x1, y1, x2, y2 = self.xyxy.T
+        hits = np.flatnonzero((bx1 < x2) & (bx2 > x1) & (by1 < y2) & (by2 > y1))
+        return int(hits[0]) if hits.size else None
+
+    def box(self, index):
+        """Box index as a tuple of Python floats."""
+        return tuple(self.xyxy[index].tolist())
+
+    def labels(self, mapping):
+        """Map class ids to names with mapping (dict); classes not in mapping give None."""
+        return [mapping.get(c) for c in self.classes.tolist()]
+
+
+class DetectionCache:
+    """The detections of the last few streamed frames, keyed by frame id.
+
+    The streaming loop publishes every frame's batch, and click handlers
+    hit-test against it instead of capturing a new frame and running the model
+    again on the request thread.
+    """
+
+    def __init__(self, keep=30):
+        self.keep = keep  # How many recent frames a client can still refer to
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+        self._next_id = 0
+
+    def publish(self, batch):
+        """Store the detections of a new frame and return its frame id."""
+        with self._lock:
+            self._next_id += 1
+            self._frames[self._next_id] = batch
+            while len(self._frames) > self.keep:
+                self._frames.popitem(last=False)
+            return self._next_id
+
+    def get(self, frame_id=None):
+        """(frame_id, batch) for frame_id if it is still cached, else for the newest frame; (None, None) if empty."""
+        with self._lock:
+            if frame_id in self._frames:
+                return frame_id, self._frames[frame_id]
+            if not self._frames:
+                return None, None
+            return next(reversed(self._frames.items()))
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+import time
+
+
+class AsyncWaiter:
+    """Lets coroutines on one event loop wait for a sequence number that threads advance.
+
+    notify() may be called from any thread; waiting costs a coroutine, not a thread.
+    """
+
+    def __init__(self, seq=0):
+        self.seq = seq
+        self.closed = False
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def notify(self, seq):
+        try:
+            self._loop.call_soon_threadsafe(self._wake, seq)
+        except RuntimeError:
+            pass  # The event loop has shut down
+
+    def close(self):
+        self.closed = True
+        self.notify(self.seq)
+
+    def _wake(self, seq):
+        self.seq = seq
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    async def wait(self, last_seq):
+        """Wait until the sequence number differs from last_seq (or the waiter is closed); return it."""
+        while self.seq == last_seq and not self.closed:
+            await self._event.wait()
+        return self.seq
+
+
+class FrameBroadcaster:
+    """Produce frames once on a background thread and fan them out to any number of clients."""
+
+    def __init__(self, produce, idle_when_unwatched=True):
+        self.produce = produce  # Callable returning the next item to publish (or None to skip)
+        self.idle_when_unwatched = idle_when_unwatched  # Pause the producer while nobody is subscribed
+
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._subscribers = 0
+        self._running = False
+        self._thread = None
+        self._waiter = None  # AsyncWaiter for asyncio subscribers, made on first use
+
+    def start(self):
+        """Start the producer thread (safe to call more than once)."""
+        with self._cond:
+            if self._thread is None:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the producer thread and wake every waiting subscriber."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._waiter is not None:
+            self._waiter.close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def publish(self, item):
+        """Replace the current item and wake all subscribers."""
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            seq = self._seq
+            self._cond.notify_all()
+        if self._waiter is not None:
+            self._waiter.notify(seq)
+
+    def latest(self):
+        """Return (sequence number, item) of the newest published item."""
+        with self._cond:
+            return self._seq, self._item
+
+    def wait_next(self, last_seq, timeout=None):
+        """Block until an item newer than last_seq is published, then return (seq, item)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != last_seq or not self._running, timeout)
+            return self._seq, self._item
+
+    def _join(self):
+        with self._cond:
+            self._subscribers += 1
+            self._cond.notify_all()
+
+    def _leave(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def subscribe(self):
+        """Yield each newly published item; items published while the client was busy are dropped."""
+        self._join()
+        try:
+            # Start from the current item, which may be a stale frame from before an idle spell
+            seq, _ = self.latest()
+            while self._running:
+                new_seq, item = self.wait_next(seq, timeout=1.0)
+                if new_seq == seq or item is None:
+                    continue  # Timed out or nothing published yet
+                seq = new_seq
+                yield item
+        finally:
+            self._leave()
+
+    async def subscribe_async(self):
+        """subscribe() for asyncio clients: waiting for the next item holds no thread."""
+        with self._cond:
+            if self._waiter is None:
+                self._waiter = AsyncWaiter(self._seq)
+            waiter = self._waiter
+        self._join()
+        try:
+            seq, _ = self.latest()  # As in subscribe(): only items published from now on
+            woken = waiter.seq  # May trail seq by a wake-up still queued on the event loop
+            while self._running:
+                woken = await waiter.wait(woken)
+                new_seq, item = self.latest()
+                if new_seq == seq or item is None:
+                    continue  # That wake-up was for the item we started from
+                seq = new_seq
+                yield item
+        finally:
+            self._leave()
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Sleep while nobody is watching so the camera and model stay idle
+                if self.idle_when_unwatched:
+                    self._cond.wait_for(lambda: self._subscribers > 0 or not self._running)
+                if not self._running:
+                    break
+            try:
+                item = self.produce()
+            except Exception as e:
+                print(f"Error producing frame: {e}")
+                time.sleep(0.1)
+                continue
+            if item is not None:
+                self.publish(item)
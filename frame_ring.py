@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+
+
+class FrameRing:
+    """A fixed set of preallocated frame buffers that capture writes straight into.
+
+    A buffer is owned by whoever acquired it until it is released, so the
+    inference and output stages can read and annotate it in place while the
+    camera fills the next one. The copy counters show how many full-frame
+    copies were made per captured frame. Only the copy out of the camera/decoder
+    into the ring is needed, so copies_per_frame should stay at 1.0.
+    """
+
+    def __init__(self, shape, slots=6, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.buffers = [np.empty(self.shape, dtype=dtype) for _ in range(slots)]
+        self._free = list(range(slots))
+        self._cond = threading.Condition()
+
+        self.frames = 0  # Frames written into the ring
+        self.copies = 0  # Full-frame copies made while filling the ring
+        self.starved = 0  # Times capture had to wait for a buffer to come back
+
+    def acquire(self, timeout=None):
+        """Take a free buffer index, waiting up to timeout seconds. Returns None on timeout."""
+        with self._cond:
+            if not self._free:
+                self.starved += 1
+                if not self._cond.wait_for(lambda: self._free, timeout):
+                    return None
+            return self._free.pop()
+
+    def release(self, index):
+        """Give a buffer back to the ring."""
+        with self._cond:
+            self._free.append(index)
+            self._cond.notify()
+
+    def capture(self, source, timeout=None):
+        """Fill a free buffer from source. Returns (index, buffer) or None if none came free in time."""
+        index = self.acquire(timeout)
+        if index is None:
+            return None
+        buffer = self.buffers[index]
+        try:
+            copies = source.capture_into(buffer)
+        except BaseException:
+            self.release(index)
+            raise
+        self.frames += 1
+        self.copies += copies
+        return index, buffer
+
+    @property
+    def copies_per_frame(self):
+        return self.copies / self.frames if self.frames else 0.0
+
+    @property
+    def avoidable_copies(self):
+        """Copies beyond the single unavoidable one per frame (should be 0)."""
+        return self.copies - self.frames
+
+    def report(self):
+        return {
+            "frames": self.frames,
+            "copies": self.copies,
+            "copies_per_frame": round(self.copies_per_frame, 3),
+            "avoidable_copies": self.avoidable_copies,
+            "starved": self.starved,
+        }
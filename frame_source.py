@@ -0,0 +1,261 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Frame sources all look like a started Picamera2 to the rest of the code:
+# capture_array() returns the next frame and stop() releases the device.
+# capture_into(out) writes the next frame into a preallocated buffer instead
+# (see frame_ring.py) and returns how many full-frame copies that took.
+#
+# Pick one with the FRAME_SOURCE environment variable (or pass a spec to open_source):
+#   picamera                 the Pi camera (default)
+#   video:/path/to/drive.mp4 a recorded video file
+#   images:/path/to/folder   a folder of still images, played in name order
+#   synthetic                generated frames with a moving box, no hardware needed
+# FRAME_PACE=realtime plays recordings at their original rate, FRAME_PACE=fast
+# returns frames as quickly as they can be decoded (for benchmarking).
+
+DEFAULT_SIZE = (320, 320)
+DEFAULT_FORMAT = "RGB888"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class EndOfStream(Exception):
+    """Raised by capture_array() when a replay source has no frames left."""
+
+
+class FrameSource:
+    """Base class for frame sources."""
+
+    def __init__(self, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT):
+        self.size = size  # (width, height)
+        self.pixel_format = pixel_format  # Picamera2 format name, e.g. "RGB888" (B, G, R in memory)
+        self.frames_read = 0
+
+    @property
+    def shape(self):
+        """Shape of the frames this source produces."""
+        width, height = self.size
+        return (height, width, 3)
+
+    def capture_array(self):
+        raise NotImplementedError
+
+    def capture_into(self, out):
+        """Write the next frame into out and return the number of full-frame copies made."""
+        np.copyto(out, self.capture_array())
+        return 1
+
+    def stop(self):
+        pass
+
+    def __iter__(self):
+        # Iterate over frames until the source runs out
+        while True:
+            try:
+                yield self.capture_array()
+            except EndOfStream:
+                return
+
+
+class PicameraSource(FrameSource):
+    """Live frames from the Raspberry Pi camera."""
+
+    def __init__(self, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT):
+        super().__init__(size, pixel_format)
+        from picamera2 import Picamera2, MappedArray  # Only needed on the Pi
+        self._mapped_array = MappedArray
+
+        # Set up the camera with Picam
+        self.picam2 = Picamera2()
+        self.picam2.preview_configuration.main.size = size
+        self.picam2.preview_configuration.main.format = pixel_format
+        self.picam2.preview_configuration.align()
+        self.picam2.configure("preview")
+        self.picam2.start()
+
+    def capture_array(self):
+        self.frames_read += 1
+        return self.picam2.capture_array()
+
+    def capture_into(self, out):
+        # Copy straight out of the camera's DMA buffer so it can go back to the driver right away
+        request = self.picam2.capture_request()
+        try:
+            with self._mapped_array(request, "main") as mapped:
+                height, width = out.shape[:2]
+                np.copyto(out, mapped.array[:height, :width, :3])
+        finally:
+            request.release()
+        self.frames_read += 1
+        return 1
+
+    def stop(self):
+        self.picam2.stop()
+
+
+class ReplaySource(FrameSource):
+    """Common pacing and format handling for recorded and generated frames."""
+
+    def __init__(self, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT, fps=30.0, pace="realtime", loop=False):
+        super().__init__(size, pixel_format)
+        self.fps = fps
+        self.pace = pace  # "realtime" or "fast"
+        self.loop = loop
+        self._next_due = None
+
+    def _wait_for_next_frame(self):
+        """Sleep until the next frame is due when replaying in real time."""
+        if self.pace != "realtime" or not self.fps:
+            return
+        now = time.monotonic()
+        if self._next_due is None or now - self._next_due > 1.0:
+            self._next_due = now  # First frame, or we fell far behind: don't try to catch up
+        elif self._next_due > now:
+            time.sleep(self._next_due - now)
+        self._next_due += 1.0 / self.fps
+
+    def _prepare(self, image, out=None):
+        """Resize to the configured size and match the configured channel order.
+
+        When out is given the result is written into it; returns (frame, full-frame copies made).
+        """
+        copies = 0
+        if (image.shape[1], image.shape[0]) != tuple(self.size):
+            image = cv2.resize(image, tuple(self.size), dst=out, interpolation=cv2.INTER_AREA)
+            copies += 1
+        # OpenCV decodes to B, G, R, which is what Picamera2 calls RGB888
+        if self.pixel_format == "BGR888":
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=out)
+            copies += 1
+        if out is not None and image is not out:
+            np.copyto(out, image)
+            image = out
+            copies += 1
+        return image, copies
+
+    def read(self):
+        """Return the next raw frame, or None when the recording is exhausted."""
+        raise NotImplementedError
+
+    def rewind(self):
+        raise NotImplementedError
+
+    def _next_image(self):
+        image = self.read()
+        if image is None and self.loop:
+            self.rewind()
+            image = self.read()
+        if image is None:
+            raise EndOfStream()
+        self._wait_for_next_frame()
+        self.frames_read += 1
+        return image
+
+    def capture_array(self):
+        return self._prepare(self._next_image())[0]
+
+    def capture_into(self, out):
+        return self._prepare(self._next_image(), out)[1]
+
+
+class VideoFileSource(ReplaySource):
+    """Frames from a recorded video file."""
+
+    def __init__(self, path, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT, fps=None, pace="realtime", loop=False):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise IOError(f"Could not open video file {path}")
+        # Pace at the recording's own frame rate unless told otherwise
+        fps = fps or self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        super().__init__(size, pixel_format, fps, pace, loop)
+
+    def read(self):
+        ok, image = self.capture.read()
+        return image if ok else None
+
+    def rewind(self):
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def stop(self):
+        self.capture.release()
+
+
+class ImageFolderSource(ReplaySource):
+    """Frames from a folder of still images, in file-name order."""
+
+    def __init__(self, folder, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT, fps=10.0, pace="realtime", loop=False):
+        super().__init__(size, pixel_format, fps, pace, loop)
+        self.paths = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not self.paths:
+            raise IOError(f"No images found in {folder}")
+        self._index = 0
+
+    def read(self):
+        while self._index < len(self.paths):
+            path = self.paths[self._index]
+            self._index += 1
+            image = cv2.imread(path)
+            if image is not None:
+                return image
+            print(f"Skipping unreadable image {path}")
+        return None
+
+    def rewind(self):
+        self._index = 0
+
+
+class SyntheticSource(ReplaySource):
+    """Generated frames (a bright box drifting over a noisy road) for runs without any recording."""
+
+    def __init__(self, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT, fps=30.0, pace="realtime", frames=None, seed=0):
+        super().__init__(size, pixel_format, fps, pace, loop=False)
+        self.frames = frames  # Stop after this many frames (None = never)
+        width, height = size
+        rng = np.random.default_rng(seed)
+        self._background = rng.integers(60, 120, size=(height, width, 3), dtype=np.uint8)
+        self._index = 0
+
+    def read(self):
+        if self.frames is not None and self._index >= self.frames:
+            return None
+        width, height = self.size
+        image = self._background.copy()
+        box = max(8, width // 6)
+        x = (self._index * 3) % max(1, width - box)
+        y = height // 2 + int(height / 6 * np.sin(self._index / 15))
+        y = min(max(0, y), height - box)
+        image[y:y + box, x:x + box] = (230, 230, 230)
+        self._index += 1
+        return image
+
+    def rewind(self):
+        self._index = 0
+
+
+def open_source(spec=None, size=DEFAULT_SIZE, pixel_format=DEFAULT_FORMAT, pace=None, loop=None):
+    """Create the frame source described by spec (defaults to the FRAME_SOURCE environment variable)."""
+    spec = spec or os.environ.get("FRAME_SOURCE", "picamera")
+    pace = pace or os.environ.get("FRAME_PACE", "realtime")
+    if loop is None:
+        loop = os.environ.get("FRAME_LOOP", "0") == "1"
+
+    kind, _, target = spec.partition(":")
+    if kind == "picamera":
+        return PicameraSource(size, pixel_format)
+    if kind == "video":
+        if os.path.isdir(target):
+            return ImageFolderSource(target, size, pixel_format, pace=pace, loop=loop)
+        return VideoFileSource(target, size, pixel_format, pace=pace, loop=loop)
+    if kind == "images":
+        return ImageFolderSource(target, size, pixel_format, pace=pace, loop=loop)
+    if kind == "synthetic":
+        frames = int(target) if target else None
+        return SyntheticSource(size, pixel_format, pace=pace, frames=frames)
+    raise ValueError(f"Unknown frame source: {spec}")
@@ -1,17 +1,16 @@
+import os
 import serial
-import time
 
-# Open the serial port (adjust to /dev/serial0 based on your results)
-ser = serial.Serial('/dev/ttyACM1', baudrate=9600, timeout=1)
+# Open the serial port (adjust to /dev/serial0 based on your results; GPS_PORT overrides it)
+# To keep what it prints, record a log instead: python gps_log.py record drive_gps.log.gz
+ser = serial.Serial(os.environ.get("GPS_PORT", '/dev/ttyACM1'), baudrate=9600, timeout=1)
 
 try:
     while True:
-        # Read a line of raw GPS data
+        # Read a line of raw GPS data; no sleep between lines, or the receiver's sentences pile up unread
         data = ser.readline()
         if data:
-            print(data.decode('utf-8').strip())  # Decode and print the raw NMEA data
-
-        time.sleep(1)  # Delay to avoid overwhelming the output
+            print(data.decode('utf-8', 'replace').strip())  # Decode and print the raw NMEA data
 
 except KeyboardInterrupt:
     print("Program exited.")
@@ -0,0 +1,192 @@
+"""Record the GPS to a timestamped NMEA log and replay it on a pseudo-terminal.
+
+Examples:
+    python gps_log.py record drive_gps.log.gz --port /dev/ttyACM1
+    python gps_log.py replay drive_gps.log.gz --speed 10 --link /tmp/gps
+    GPS_PORT=/tmp/gps python road_with_gps.py
+
+A log is one sentence per line, prefixed with the seconds since the recording
+started ("12.345<TAB>$GNGGA,..."); paths ending in .gz are gzip-compressed,
+which shrinks NMEA about tenfold. Recording to an existing log appends a new
+session: it starts with a "# session" line and its offsets start again at 0,
+and read_log carries the times on from the end of the previous session.
+nmea.load_log reads these logs directly, so a recording can go straight into
+reprocess.py.
+
+The replayer serves the log on a Linux pseudo-terminal that the unchanged
+serial code opens like the real receiver (point GPS_PORT at it). --speed plays
+it faster than real time to stress the reader: at --speed 10 a 10 Hz
+multi-constellation receiver becomes 1000+ sentences a second. Like a real
+UART, the replayer never waits for a slow reader: sentences that do not fit in
+the terminal's buffer are dropped and counted.
+"""
+import argparse
+import gzip
+import os
+import time
+import tty
+from datetime import datetime
+
+SESSION_MARK = "# session"  # Starts each recording in a log; offsets restart at 0 after it
+
+
+class GpsLogWriter:
+    """Appends sentences to a log with their time since the recording started."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, "at") if path.endswith(".gz") else open(path, "a")
+        self._file.write(f"{SESSION_MARK} {datetime.now().isoformat(timespec='seconds')}\n")
+        self._started = None
+        self.sentences = 0
+
+    def write(self, sentence, at=None):
+        """Log one sentence received at monotonic time at (now if omitted)."""
+        at = time.monotonic() if at is None else at
+        if self._started is None:
+            self._started = at
+        self._file.write(f"{at - self._started:.3f}\t{sentence}\n")
+        self.sentences += 1
+
+    def close(self):
+        self._file.close()  # Writes the gzip trailer; safe to call more than once
+
+
+def read_log(path):
+    """Yield (seconds since the start, sentence) for every line of a log.
+
+    The times only increase over the whole log: each later session carries on
+    from where the one before it ended.
+    """
+    base = 0.0  # End of the sessions before this one
+    last = 0.0
+    with (gzip.open(path, "rt") if path.endswith(".gz") else open(path)) as f:
+        for line in f:
+            if line.startswith(SESSION_MARK):
+                base = last
+                continue
+            offset, _, sentence = line.rstrip("\r\n").partition("\t")
+            try:
+                offset = float(offset)
+            except ValueError:
+                continue  # Not a log line (e.g. a raw NMEA capture); skip it
+            if base + offset < last:
+                base = last  # A session appended before logs had session lines
+            last = base + offset
+            yield last, sentence
+
+
+def open_pty(link=None):
+    """Open a pseudo-terminal in raw mode; returns (master fd, slave path).
+
+    The master is non-blocking so a reader that stops draining the slave can't
+    stall the replay. With link, a symlink to the slave is made there (a stable
+    path for GPS_PORT).
+    """
+    master, slave = os.openpty()
+    tty.setraw(slave)  # No echo or line editing: bytes pass through as on a serial line
+    os.set_blocking(master, False)
+    path = os.ttyname(slave)
+    if link:
+        if os.path.islink(link):
+            os.remove(link)
+        os.symlink(path, link)
+    # The slave fd stays open, so the terminal survives the reader closing and reopening it
+    return master, path
+
+
+def replay(path, master, speed=1.0, loop=False, wait_s=0.0, report_every_s=5.0):
+    """Write a log's sentences to the pty master at speed times real time (0 for as fast as possible).
+
+    wait_s gives the program under test time to open the terminal first.
+    """
+    stats = {"sentences": 0, "dropped": 0, "bytes": 0}
+    pending = b""  # Tail of a sentence the terminal only took part of
+    time.sleep(wait_s)
+    began = time.monotonic()
+    last_report = began
+    while True:
+        started = time.monotonic()
+        for offset, sentence in read_log(path):
+            if speed > 0:
+                delay = started + offset / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            data = (sentence + "\r\n").encode("ascii", "replace")
+            try:
+                if pending:
+                    pending = pending[os.write(master, pending):]
+                if pending:
+                    raise BlockingIOError
+                written = os.write(master, data)
+                pending = data[written:]  # Finished before the next sentence, so none is ever cut short
+                stats["sentences"] += 1
+                stats["bytes"] += len(data)
+            except BlockingIOError:
+                stats["dropped"] += 1  # The reader is not keeping up and the terminal buffer is full
+            now = time.monotonic()
+            if now - last_report >= report_every_s:
+                last_report = now
+                print(f"Replay: {stats['sentences'] / (now - began):.0f} sentences/s, {stats}")
+        if not loop:
+            break
+    return stats
+
+
+def record(path, port, baudrate=9600, echo=False, report_every_s=10.0):
+    """Log every sentence from the GPS on port until interrupted."""
+    import serial
+    from gps_reader import GpsReader
+
+    log = GpsLogWriter(path)
+    ser = serial.Serial(port, baudrate=baudrate, timeout=1)
+    gps = GpsReader(ser, log=log, echo=echo).start()
+    try:
+        while True:
+            time.sleep(report_every_s)
+            print(f"Recorded {log.sentences} sentences, GPS: {gps.report()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gps.stop()  # Also closes the log
+        ser.close()
+    print(f"Recorded {log.sentences} sentences to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or replay a GPS NMEA log")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="log the GPS to a file")
+    rec.add_argument("log", help="output log (.gz to compress)")
+    rec.add_argument("--port", default=os.environ.get("GPS_PORT", "/dev/ttyACM1"))
+    rec.add_argument("--baud", type=int, default=9600)
+    rec.add_argument("--echo", action="store_true", help="also print every sentence")
+
+    play = commands.add_parser("replay", help="serve a log on a pseudo-terminal")
+    play.add_argument("log")
+    play.add_argument("--speed", type=float, default=1.0, help="times real time; 0 sends as fast as possible")
+    play.add_argument("--loop", action="store_true", help="start over at the end of the log")
+    play.add_argument("--link", help="make a symlink to the pseudo-terminal here, e.g. /tmp/gps")
+    play.add_argument("--wait", type=float, default=2.0, help="seconds to wait before the first sentence")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.log, args.port, args.baud, args.echo)
+        return
+
+    master, path = open_pty(args.link)
+    pace = f"{args.speed}x real time" if args.speed > 0 else "full speed"
+    print(f"Replaying {args.log} on {args.link or path} at {pace} (GPS_PORT={args.link or path})")
+    try:
+        stats = replay(args.log, master, args.speed, args.loop, args.wait)
+        print(f"Replay finished: {stats}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.link and os.path.islink(args.link):
+            os.remove(args.link)
+
+
+if __name__ == "__main__":
+    main()
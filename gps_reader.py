@@ -0,0 +1,368 @@
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+from gps_log import GpsLogWriter
+from nmea import MAX_SENTENCE, NmeaParser
+
+
+EARTH_M_PER_DEG = 111320.0  # Metres per degree of latitude (and of longitude at the equator)
+
+
+# The newest fix as published by GpsState: seq counts fixes (0 before the first one),
+# received_at is the monotonic time the fix arrived.
+GpsSnapshot = namedtuple("GpsSnapshot", "seq fix received_at")
+
+
+class GpsState:
+    """The newest fix, shared with every consumer as one immutable snapshot.
+
+    publish() builds a new GpsSnapshot and swaps it in with a single attribute
+    assignment, which is atomic in Python, so snapshot() needs no lock: readers
+    on the detection loop or HTTP threads always get a fix, its time and its
+    sequence number that belong together, never a new latitude with an old
+    longitude. wait_next(seq) blocks until a newer fix is published; only
+    threads that actually wait touch the condition. There is one publisher,
+    the reader thread.
+    """
+
+    def __init__(self):
+        self._snapshot = GpsSnapshot(0, None, None)
+        self._cond = threading.Condition()
+        self._waiting = 0
+
+    def publish(self, fix, received_at):
+        snapshot = GpsSnapshot(self._snapshot.seq + 1, fix, received_at)
+        self._snapshot = snapshot
+        # A waiter that registers after this check already sees the new snapshot in wait_for
+        if self._waiting:
+            with self._cond:
+                self._cond.notify_all()
+        return snapshot
+
+    def snapshot(self):
+        return self._snapshot
+
+    def wait_next(self, seq, timeout=None):
+        """The first snapshot newer than seq, or the current one if none arrives within timeout."""
+        snapshot = self._snapshot
+        if snapshot.seq > seq:
+            return snapshot
+        with self._cond:
+            self._waiting += 1
+            try:
+                self._cond.wait_for(lambda: self._snapshot.seq > seq, timeout)
+            finally:
+                self._waiting -= 1
+        return self._snapshot
+
+
+class FixHistory:
+    """The last few seconds of fixes, for looking up where the vehicle was at a given instant.
+
+    Fixes are kept in preallocated parallel lists used as a ring, in time order,
+    so position_at() is a binary search plus one interpolation: O(log n) and
+    without building any lists per call. Between two fixes the position is
+    interpolated linearly; past the newest one it is extrapolated from its speed
+    and heading for at most max_extrapolate_s. Instants before the history, or
+    in a gap longer than max_gap_s (a GPS outage), have no position.
+
+    Lookups take no lock. The single writer bumps a version number before and
+    after changing the ring (a seqlock), and a lookup that overlapped a write
+    simply runs again, so detection threads never wait on the GPS thread.
+    """
+
+    def __init__(self, size=64, max_extrapolate_s=1.5, max_gap_s=5.0):
+        self.size = size
+        self.max_extrapolate_s = max_extrapolate_s
+        self.max_gap_s = max_gap_s
+        self._times = [0.0] * size
+        self._lats = [0.0] * size
+        self._lons = [0.0] * size
+        self._speeds = [None] * size
+        self._headings = [None] * size
+        self._start = 0  # Ring index of the oldest fix
+        self._count = 0
+        self._version = 0  # Odd while add() is changing the ring
+
+        self.interpolated = 0
+        self.extrapolated = 0
+        self.missed = 0  # Lookups with no usable fix around the instant
+        self.retries = 0  # Lookups that overlapped a write and ran again
+
+    def add(self, at, fix):
+        """Record fix as the position at monotonic time at (never older than the newest fix)."""
+        if self._count:
+            last = (self._start + self._count - 1) % self.size
+            if at < self._times[last]:
+                return  # Out of order: keep the history sorted
+        self._version += 1
+        try:
+            if self._count:
+                if at == self._times[last]:
+                    i = last  # Same epoch (GGA and RMC): replace, the later sentence may add speed
+                elif self._count < self.size:
+                    i = (last + 1) % self.size
+                    self._count += 1
+                else:
+                    i = self._start
+                    self._start = (self._start + 1) % self.size
+            else:
+                i = self._start
+                self._count = 1
+            self._times[i] = at
+            self._lats[i] = fix.lat
+            self._lons[i] = fix.lon
+            self._speeds[i] = fix.speed
+            self._headings[i] = fix.heading
+        finally:
+            self._version += 1
+
+    def position_at(self, at):
+        """(latitude, longitude) at monotonic time at, or None if the history cannot tell."""
+        while True:
+            version = self._version
+            if not version & 1:
+                position, extrapolated = self._lookup(at)
+                if self._version == version:
+                    break
+            self.retries += 1
+            time.sleep(0)  # Let the writer finish
+        if position is None:
+            self.missed += 1
+        elif extrapolated:
+            self.extrapolated += 1
+        else:
+            self.interpolated += 1
+        return position
+
+    def _lookup(self, at):
+        """(position or None, extrapolated); may see a half-written ring, which position_at discards."""
+        count, start, size, times = self._count, self._start, self.size, self._times
+        if count == 0:
+            return None, False
+        # Binary search for the first fix later than at, over ring positions 0..count
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[(start + mid) % size] <= at:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == count:
+            return self._extrapolate((start + count - 1) % size, at), True
+        if lo == 0:
+            return None, False  # Older than anything we still have
+        i, j = (start + lo - 1) % size, (start + lo) % size
+        t0, t1 = times[i], times[j]
+        if t1 - t0 > self.max_gap_s or t1 <= t0:
+            return None, False
+        w = (at - t0) / (t1 - t0)
+        return (self._lats[i] + w * (self._lats[j] - self._lats[i]),
+                self._lons[i] + w * (self._lons[j] - self._lons[i])), False
+
+    def _extrapolate(self, i, at):
+        dt = at - self._times[i]
+        if dt > self.max_extrapolate_s:
+            return None
+        lat, lon = self._lats[i], self._lons[i]
+        speed, heading = self._speeds[i], self._headings[i]
+        if not speed or heading is None or dt <= 0:
+            return lat, lon  # Standing still, or no course reported yet
+        distance = speed * dt
+        heading = math.radians(heading)
+        return (lat + distance * math.cos(heading) / EARTH_M_PER_DEG,
+                lon + distance * math.sin(heading) / (EARTH_M_PER_DEG * math.cos(math.radians(lat))))
+
+    def report(self):
+        count, start = self._count, self._start
+        span = self._times[(start + count - 1) % self.size] - self._times[start] if count > 1 else 0.0
+        return {"fixes": count, "span_s": round(span, 2), "interpolated": self.interpolated,
+                "extrapolated": self.extrapolated, "missed": self.missed, "retries": self.retries}
+
+
+class GpsReader:
+    """Drains a GPS serial port on a background thread and keeps only the newest fix.
+
+    Reading one line and then sleeping lets the receiver's 5-10 sentences a
+    second pile up in the OS buffer, so the "current" position falls further
+    behind the longer the program runs. This reads whatever is waiting as soon
+    as it arrives, parses every complete sentence with nmea.NmeaParser and
+    stamps each new nmea.Fix with time.monotonic() at reception; on_fix(fix), if
+    given, is called with it on the reader thread. Consumers use
+    fresh_fix(max_age) to refuse stale positions, or position_at(captured_at)
+    for where the vehicle was when a frame was captured. With a log
+    (gps_log.GpsLogWriter) every sentence is also recorded as it arrives.
+    """
+
+    def __init__(self, ser, on_fix=None, max_line=MAX_SENTENCE, history_size=64, max_extrapolate_s=1.5,
+                 log=None, echo=False):
+        self.ser = ser  # An open serial.Serial (with a read timeout)
+        self.on_fix = on_fix
+        self.log = log
+        self.echo = echo  # Print every raw sentence
+        self.max_line = max_line  # Longer "lines" are noise (no newline seen), not NMEA
+        self.parser = NmeaParser()
+        self.history = FixHistory(history_size, max_extrapolate_s)
+        self._utc_offset = None  # Monotonic time minus UTC seconds for the quickest delivery seen
+        baudrate = getattr(ser, "baudrate", None)
+        self._byte_time = 10.0 / baudrate if baudrate else 0.0  # Seconds per byte on the wire (8N1)
+        self._last_utc = None
+
+        self.state = GpsState()  # Newest fix, readable from any thread without a lock
+        self._running = False
+        self._thread = None
+
+        # Counters for checking the reader keeps up
+        self.sentences = 0
+        self.fixes = 0
+        self.dropped = 0  # Lines that could not be decoded or overflowed (see the parser for checksum failures)
+        self.bytes_read = 0
+        self.backlog_bytes = 0  # Bytes waiting in the OS buffer at the last read
+        self.max_backlog_bytes = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the reader thread and close the log, if any (a .gz log is only complete once closed)."""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.log is not None:
+            self.log.close()
+
+    def _run(self):
+        pending = b""
+        while self._running:
+            try:
+                waiting = self.ser.in_waiting
+                # Take everything already buffered; otherwise block (up to the port timeout) for the next byte
+                data = self.ser.read(waiting or 1)
+            except Exception as e:
+                print(f"Error reading GPS data: {e}")
+                time.sleep(1)
+                continue
+            if not data:
+                continue
+            received_at = time.monotonic()
+            self.bytes_read += len(data)
+            self.backlog_bytes = waiting
+            self.max_backlog_bytes = max(self.max_backlog_bytes, waiting)
+
+            pending += data
+            *lines, pending = pending.split(b"\n")
+            if len(pending) > self.max_line:
+                pending = b""
+                self.dropped += 1
+            for line in lines:
+                self._handle(line, received_at)
+
+    def _handle(self, line, received_at):
+        try:
+            sentence = line.decode("ascii").strip()
+        except UnicodeDecodeError:
+            self.dropped += 1
+            return
+        if not sentence:
+            return
+        self.sentences += 1
+        if self.log is not None:
+            self.log.write(sentence, received_at)
+        if self.echo:
+            print(sentence)
+        fix = self.parser.feed(sentence)
+        if fix is None:
+            return
+        self.state.publish(fix, received_at)
+        # The sentence was complete only after its own bytes crossed the wire
+        self.history.add(self._epoch_time(fix, received_at - (len(line) + 1) * self._byte_time), fix)
+        self.fixes += 1
+        if self.on_fix is not None:
+            try:
+                self.on_fix(fix)
+            except Exception as e:
+                print(f"Error handling GPS fix: {e}")
+
+    def _epoch_time(self, fix, received_at):
+        """Monotonic time of the instant the fix describes.
+
+        A sentence arrives 100-300 ms after its epoch (the receiver's processing
+        plus the transfer at 9600 baud), so stamping fixes on arrival would put
+        every detection that far behind the vehicle. The UTC time in the fix is
+        exact; it is mapped onto the monotonic clock with the smallest
+        arrival-minus-UTC offset seen, i.e. the least-delayed delivery, once the
+        sentence's own transfer time has been taken off its arrival.
+        """
+        if fix.utc is None:
+            return received_at
+        offset = received_at - fix.utc
+        if self._utc_offset is None or offset < self._utc_offset or offset > self._utc_offset + 1.0:
+            self._utc_offset = offset  # First fix, a quicker delivery, or a jump (midnight, receiver restart)
+        elif fix.utc != self._last_utc:
+            self._utc_offset += 0.001  # Creep up 1 ms per epoch so the estimate follows slow clock drift
+        self._last_utc = fix.utc
+        return fix.utc + self._utc_offset
+
+    def position_at(self, at):
+        """(latitude, longitude) at monotonic time at (e.g. a frame's captured_at), or None."""
+        return self.history.position_at(at)
+
+    def latest(self):
+        """GpsSnapshot(seq, fix, received_at) of the newest fix; fix is None before the first one."""
+        return self.state.snapshot()
+
+    def wait_for_fix(self, seq, timeout=None):
+        """Block until a fix newer than snapshot number seq arrives (or timeout); returns the newest snapshot."""
+        return self.state.wait_next(seq, timeout)
+
+    def fix_age(self):
+        """Seconds since the newest fix was received, or None if there is none yet."""
+        snapshot = self.latest()
+        return time.monotonic() - snapshot.received_at if snapshot.fix is not None else None
+
+    def fresh_fix(self, max_age):
+        """The newest Fix if it is at most max_age seconds old, else None."""
+        snapshot = self.latest()
+        if snapshot.fix is None or time.monotonic() - snapshot.received_at > max_age:
+            return None
+        return snapshot.fix
+
+    def report(self):
+        snapshot = self.latest()
+        age = time.monotonic() - snapshot.received_at if snapshot.fix is not None else None
+        return {
+            "seq": snapshot.seq,
+            "quality": snapshot.fix.quality if snapshot.fix is not None else None,
+            "hdop": snapshot.fix.hdop if snapshot.fix is not None else None,
+            "fix_age_s": round(age, 2) if age is not None else None,
+            "sentences": self.sentences,
+            "fixes": self.fixes,
+            "dropped": self.dropped,
+            "bad_checksum": self.parser.bad_checksum,
+            "malformed": self.parser.malformed,
+            "bytes_read": self.bytes_read,
+            "backlog_bytes": self.backlog_bytes,
+            "max_backlog_bytes": self.max_backlog_bytes,
+            "history": self.history.report(),
+        }
+
+
+def open_gps_reader(default_port, on_fix=None, baudrate=9600, **kwargs):
+    """GpsReader on the GPS_PORT environment variable (e.g. a gps_log.py replay), else default_port.
+
+    With GPS_LOG set, every sentence is also recorded to that file.
+    """
+    import serial
+
+    port = os.environ.get("GPS_PORT", default_port)
+    log_path = os.environ.get("GPS_LOG")
+    if log_path:
+        kwargs.setdefault("log", GpsLogWriter(log_path))
+    return GpsReader(serial.Serial(port, baudrate=baudrate, timeout=1), on_fix, **kwargs)
@@ -0,0 +1,68 @@
+import time
+from collections import deque
+
+import numpy as np
+
+
+class StageTimes:
+    """Collects per-stage latencies (in milliseconds) and summarises them as percentiles."""
+
+    def __init__(self):
+        self.samples = {}  # stage name -> list of milliseconds
+
+    def add(self, stage, ms):
+        self.samples.setdefault(stage, []).append(ms)
+
+    def time(self, stage):
+        """Context manager that records how long its block took under stage."""
+        return _StageTimer(self, stage)
+
+    def summary(self):
+        """Return {stage: {count, mean, p50, p95, p99, max}} in milliseconds."""
+        report = {}
+        for stage, values in self.samples.items():
+            values = np.asarray(values, dtype=np.float64)
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            report[stage] = {
+                "count": int(values.size),
+                "mean": round(float(values.mean()), 3),
+                "p50": round(float(p50), 3),
+                "p95": round(float(p95), 3),
+                "p99": round(float(p99), 3),
+                "max": round(float(values.max()), 3),
+            }
+        return report
+
+
+class _StageTimer:
+    __slots__ = ("times", "stage", "start")
+
+    def __init__(self, times, stage):
+        self.times = times
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.times.add(self.stage, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class FpsMeter:
+    """End-to-end frame rate over a sliding window of recent frames."""
+
+    def __init__(self, window=30):
+        self._ticks = deque(maxlen=window)
+
+    def tick(self):
+        """Mark one frame as fully processed."""
+        self._ticks.append(time.monotonic())
+
+    @property
+    def fps(self):
+        if len(self._ticks) < 2:
+            return 0.0
+        elapsed = self._ticks[-1] - self._ticks[0]
+        return (len(self._ticks) - 1) / elapsed if elapsed > 0 else 0.0
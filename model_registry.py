@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+# Folders searched (in order) for a model given by name, e.g. "yolov8n_ncnn_model".
+# MODEL_DIR can point somewhere else, such as /home/hasin on the Pi.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIRS = [d for d in (os.environ.get("MODEL_DIR"), REPO_DIR, os.getcwd(), os.path.expanduser("~")) if d]
+
+WARMUP_SHAPE = (320, 320, 3)
+
+
+def resolve_model_path(name):
+    """Find a model by name in MODEL_DIRS; falls back to the name itself (e.g. for yolov8n.pt downloads)."""
+    if os.path.isabs(name):
+        return name
+    for folder in MODEL_DIRS:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return path
+    return name
+
+
+class _Entry:
+    """One model: where it lives, the loaded instance and how long it took to get ready."""
+
+    def __init__(self, name):
+        self.name = name
+        self.path = resolve_model_path(name)
+        self.lock = threading.Lock()
+        self.model = None
+        self.error = None
+        self.load_s = None
+        self.warmup_s = None
+
+
+class ModelRegistry:
+    """Loads each model once per process and shares it between every user.
+
+    preload() starts loading (and warming up) in the background and returns
+    straight away, so a Flask server can bind its port while the model loads.
+    get() returns the ready model, waiting for a load in progress if needed.
+    """
+
+    def __init__(self, warmup_runs=2, warmup_shape=WARMUP_SHAPE):
+        self.warmup_runs = warmup_runs
+        self.warmup_shape = warmup_shape
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _entry(self, name):
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name)
+            return self._entries[name]
+
+    def _load(self, entry):
+        # Called with entry.lock held
+        if entry.model is not None:
+            return entry.model
+        from ultralytics import YOLO
+
+        start = time.perf_counter()
+        model = YOLO(entry.path)
+        entry.load_s = time.perf_counter() - start
+
+        # Run a few passes on a blank frame so the first real frame doesn't pay for setup
+        dummy = np.zeros(self.warmup_shape, dtype=np.uint8)
+        start = time.perf_counter()
+        for _ in range(self.warmup_runs):
+            model(dummy, imgsz=self.warmup_shape[0], verbose=False)
+        entry.warmup_s = time.perf_counter() - start
+
+        entry.model = model
+        print(f"Loaded {entry.name} from {entry.path} in {entry.load_s:.2f} s (warm-up {entry.warmup_s:.2f} s)")
+        return model
+
+    def get(self, name):
+        """Return the shared instance of a model, loading it now if nobody has yet."""
+        entry = self._entry(name)
+        if entry.model is not None:
+            return entry.model
+        with entry.lock:
+            if entry.error is not None:
+                raise entry.error
+            return self._load(entry)
+
+    def preload(self, name):
+        """Start loading a model in the background."""
+        entry = self._entry(name)
+
+        def load():
+            with entry.lock:
+                try:
+                    self._load(entry)
+                except Exception as e:
+                    entry.error = e
+                    print(f"Error loading model {name}: {e}")
+
+        threading.Thread(target=load, daemon=True).start()
+        return LazyModel(self, name)
+
+    def timings(self):
+        """Load and warm-up times (seconds) for every model seen so far."""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            e.name: {"path": e.path, "loaded": e.model is not None, "load_s": e.load_s, "warmup_s": e.warmup_s}
+            for e in entries
+        }
+
+
+class LazyModel:
+    """Stands in for a YOLO model and forwards to the shared instance once it is loaded."""
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self.name = name
+
+    @property
+    def ready(self):
+        return self._registry._entry(self.name).model is not None
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self.name)(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self.name), attr)
+
+
+registry = ModelRegistry()
+
+
+def load_model(name, background=True):
+    """Get a shared model by name. With background=True loading starts now and the first call waits for it."""
+    if background:
+        return registry.preload(name)
+    registry.get(name)
+    return LazyModel(registry, name)
+
+
+def model_timings():
+    return registry.timings()
@@ -0,0 +1,82 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Skips YOLO on frames that look the same as the last one the model saw.
+
+    Each frame is shrunk to a small grayscale thumbnail and compared with the
+    thumbnail of the last inferred frame. If fewer than threshold percent of the
+    pixels changed by more than pixel_delta, the previous detections are reused.
+    The model still runs at least every refresh_every frames, so slow changes
+    and objects that never move are not missed.
+    """
+
+    def __init__(self, threshold=2.0, pixel_delta=20, refresh_every=30, thumb_size=(64, 64)):
+        self.threshold = threshold  # Percent of thumbnail pixels that must change to re-run the model
+        self.pixel_delta = pixel_delta  # Grey-level change that counts a pixel as changed
+        self.refresh_every = refresh_every  # Always run the model after this many skipped frames
+        self.thumb_size = thumb_size
+
+        self._reference = None  # Thumbnail of the last inferred frame
+        self._since_inference = 0
+        self.results = None  # Detections from the last inference
+
+        self.frames = 0
+        self.skipped = 0
+        self.inference_ms = 0.0  # Total time spent in the model
+        self.gate_ms = 0.0  # Total time spent deciding
+        self.last_change = 0.0  # Percent of pixels changed in the last frame checked
+
+    def _thumbnail(self, frame):
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def should_infer(self, frame):
+        """Return True if the frame has changed enough (or it's time for a forced refresh)."""
+        start = time.perf_counter()
+        thumb = self._thumbnail(frame)
+        if self._reference is None or self.results is None or self._since_inference >= self.refresh_every:
+            changed = True
+        else:
+            diff = cv2.absdiff(thumb, self._reference)
+            self.last_change = 100.0 * np.count_nonzero(diff > self.pixel_delta) / diff.size
+            changed = self.last_change >= self.threshold
+        if changed:
+            self._reference = thumb
+            self._since_inference = 0
+        else:
+            self._since_inference += 1
+        self.gate_ms += (time.perf_counter() - start) * 1000
+        return changed
+
+    def run(self, model, frame, **model_kwargs):
+        """Run model on frame if the scene changed, otherwise return the previous results."""
+        self.frames += 1
+        if not self.should_infer(frame):
+            self.skipped += 1
+            return self.results
+        start = time.perf_counter()
+        self.results = model(frame, **model_kwargs)
+        self.inference_ms += (time.perf_counter() - start) * 1000
+        return self.results
+
+    @property
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def report(self):
+        """Skip ratio and an estimate of the model time saved (net of the gate's own cost)."""
+        inferred = self.frames - self.skipped
+        mean_inference_ms = self.inference_ms / inferred if inferred else 0.0
+        saved_ms = self.skipped * mean_inference_ms - self.gate_ms
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skip_ratio, 3),
+            "mean_inference_ms": round(mean_inference_ms, 2),
+            "gate_ms_per_frame": round(self.gate_ms / self.frames, 3) if self.frames else 0.0,
+            "cpu_saved_s": round(saved_ms / 1000, 2),
+        }
@@ -0,0 +1,177 @@
+import threading
+import time
+
+from frame_source import EndOfStream
+from pipeline import CapturedFrame
+
+
+class ModelTask:
+    """One model to run on the shared camera stream, at up to rate_hz."""
+
+    def __init__(self, name, model, rate_hz, handle_results=None, model_kwargs=None):
+        self.name = name
+        self.model = model
+        self.rate_hz = rate_hz
+        self.handle_results = handle_results  # callback(frame, results), run right after inference
+        self.model_kwargs = model_kwargs or {}
+
+        self.next_due = 0.0
+        self.cost_s = None  # Running average of one inference, in seconds
+        self.runs = 0
+        self.first_run = None
+        self.last_frame_id = None
+        self.result_age_ms = 0.0  # Capture-to-result time of the latest result
+        self.last_result_at = None  # Monotonic time the latest result became available
+        self.last_capture_at = None  # Capture time of the frame behind the latest result
+
+    def record(self, frame, started, finished, timed=True):
+        """Account for one inference; timed=False keeps it out of cost_s (e.g. it waited for the model to load)."""
+        if timed:
+            cost = finished - started
+            self.cost_s = cost if self.cost_s is None else 0.8 * self.cost_s + 0.2 * cost
+        self.runs += 1
+        if self.first_run is None:
+            self.first_run = started
+        self.last_frame_id = frame.frame_id
+        self.result_age_ms = (finished - frame.captured_at) * 1000
+        self.last_result_at = finished
+        self.last_capture_at = frame.captured_at
+
+
+class MultiModelScheduler:
+    """Owns one frame source and runs several models against its frames, each at its own rate.
+
+    A capture thread keeps the newest frame. A single inference thread always
+    runs whichever task is most overdue, so the models interleave instead of
+    fighting over the CPU. If the requested rates would keep the inference
+    thread busier than cpu_target (a fraction of one inference thread's time),
+    every rate is scaled down by the same factor.
+    """
+
+    def __init__(self, source, tasks, cpu_target=0.8):
+        self.source = source
+        self.tasks = tasks
+        self.cpu_target = cpu_target
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._running = False
+        self._threads = []
+        self.scale = 1.0  # Factor applied to every task's rate to stay within cpu_target
+        self.busy_s = 0.0
+        self.started_at = None
+
+    def _capture_loop(self):
+        frame_id = 0
+        while self._running:
+            try:
+                image = self.source.capture_array()
+            except EndOfStream:
+                break
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                time.sleep(0.1)
+                continue
+            frame_id += 1
+            with self._cond:
+                self._frame = CapturedFrame(frame_id, time.monotonic(), image)
+                self._cond.notify_all()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def _update_scale(self):
+        # Fraction of the inference thread the requested rates would use
+        demand = sum(t.rate_hz * t.cost_s for t in self.tasks if t.cost_s is not None)
+        self.scale = min(1.0, self.cpu_target / demand) if demand > 0 else 1.0
+
+    def _inference_loop(self):
+        while self._running:
+            task = min(self.tasks, key=lambda t: t.next_due)
+            wait = task.next_due - time.monotonic()
+            with self._cond:
+                if wait > 0:
+                    self._cond.wait(timeout=wait)
+                    continue  # Woken early (new frame or stop): pick again
+                frame = self._frame
+            if frame is None:
+                with self._cond:
+                    self._cond.wait(timeout=0.1)
+                continue
+            if frame.frame_id == task.last_frame_id:
+                # This model already saw the newest frame; wait for the next one
+                with self._cond:
+                    self._cond.wait(timeout=0.1)
+                continue
+
+            # A model still loading in the background makes this call wait for its load and
+            # warm-up; that time says nothing about its inference cost
+            loaded = getattr(task.model, "ready", True)
+            started = time.monotonic()
+            try:
+                results = task.model(frame.image, **task.model_kwargs)
+            except Exception as e:
+                print(f"Error running {task.name}: {e}")
+                task.next_due = started + 1.0
+                continue
+            finished = time.monotonic()
+            task.record(frame, started, finished, timed=loaded)
+            if loaded:
+                self.busy_s += finished - started
+            self._update_scale()
+            task.next_due = started + 1.0 / (task.rate_hz * self.scale)
+
+            if task.handle_results is not None:
+                try:
+                    task.handle_results(frame, results)
+                except Exception as e:
+                    print(f"Error handling {task.name} results: {e}")
+
+    def start(self):
+        self._running = True
+        self.started_at = time.monotonic()
+        self._threads = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._inference_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    @property
+    def running(self):
+        return self._running
+
+    def report(self):
+        """Per-model target and achieved rates, plus how far each model's results trail the camera."""
+        now = time.monotonic()
+        elapsed = now - self.started_at if self.started_at else 0.0
+        with self._cond:
+            newest = self._frame
+        report = {
+            "cpu_target": self.cpu_target,
+            "cpu_used": round(self.busy_s / elapsed, 3) if elapsed > 0 else 0.0,
+            "rate_scale": round(self.scale, 3),
+            "models": {},
+        }
+        for t in self.tasks:
+            active = now - t.first_run if t.first_run is not None else 0.0
+            report["models"][t.name] = {
+                "target_hz": t.rate_hz,
+                "budget_hz": round(t.rate_hz * self.scale, 2),
+                "achieved_hz": round(t.runs / active, 2) if active > 0 else 0.0,
+                "inference_ms": round(t.cost_s * 1000, 1) if t.cost_s is not None else None,
+                "result_age_ms": round(t.result_age_ms, 1),
+                # How far this model's latest result trails the newest captured frame
+                "lag_ms": round((newest.captured_at - t.last_capture_at) * 1000, 1)
+                if newest is not None and t.last_capture_at is not None else None,
+            }
+        return report
@@ -0,0 +1,271 @@
+"""NMEA 0183 parsing shared by every GPS script.
+
+NmeaParser turns live sentences into Fix records one at a time; load_log
+parses a whole recorded log into NumPy arrays for offline geotagging.
+Sentences are accepted from any talker ($GP GPS, $GN multi-constellation,
+$GL GLONASS, $GA Galileo, $GB/$BD BeiDou), and a sentence whose *hh checksum
+does not match is rejected. Sentences without a checksum are accepted, as
+the standard allows.
+"""
+import gzip
+import re
+from collections import namedtuple
+
+import numpy as np
+
+KNOTS_TO_MS = 0.514444
+MAX_SENTENCE = 100  # The standard caps sentences at 82 characters; anything much longer is line noise
+MAX_SPEED_AGE_S = 3.0  # A speed and heading no RMC/VTG has repeated for this long are dropped
+
+# One position. speed is in m/s, heading in degrees true, quality the GGA fix quality
+# (0 none, 1 GPS, 2 DGPS, 4/5 RTK, ...), utc seconds since midnight. A field is None
+# until some sentence has reported it.
+Fix = namedtuple("Fix", "lat lon speed heading quality hdop utc")
+
+# A recorded drive: one NumPy array per field, one entry per epoch, sorted by utc.
+Track = namedtuple("Track", "utc lat lon speed heading quality hdop")
+
+
+def checksum_ok(sentence):
+    """True if sentence ($...*hh) matches its checksum, or carries none."""
+    star = sentence.rfind("*")
+    if star < 0:
+        return True
+    checksum = 0
+    for char in sentence[1:star]:
+        checksum ^= ord(char)
+    try:
+        return int(sentence[star + 1:star + 3], 16) == checksum
+    except ValueError:
+        return False
+
+
+def utc_seconds(hhmmss):
+    """Convert an NMEA hhmmss.ss time to seconds since midnight."""
+    return int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + float(hhmmss[4:])
+
+
+def nmea_degrees(value, hemisphere):
+    """Convert an NMEA ddmm.mmmm coordinate to signed decimal degrees."""
+    raw = float(value)
+    degrees = raw // 100 + (raw % 100) / 60
+    return -degrees if hemisphere in ("S", "W") else degrees
+
+
+def _float(value):
+    return float(value) if value else None
+
+
+class NmeaParser:
+    """Live parser: feed() it one sentence at a time and it returns a Fix whenever one carries a position.
+
+    GGA and RMC give the position; the speed and heading (RMC, VTG) and the
+    HDOP (GGA, GSA) are remembered between sentences, so every Fix carries the
+    newest value of each. The speed and heading are forgotten when an RMC
+    reports no fix (status V), or when no RMC/VTG has refreshed them for
+    MAX_SPEED_AGE_S of GPS time, so a receiver that stops sending them can't
+    leave an old speed on every later Fix.
+    """
+
+    def __init__(self):
+        self.speed = None
+        self.heading = None
+        self.quality = None
+        self.hdop = None
+        self.fix = None  # Newest Fix
+        self._utc = None  # Newest UTC time from a GGA or RMC
+        self._speed_utc = None  # UTC time the speed and heading were last reported
+        self._handlers = {"GGA": self._gga, "RMC": self._rmc, "VTG": self._vtg, "GSA": self._gsa}
+
+        self.sentences = 0
+        self.bad_checksum = 0
+        self.malformed = 0
+        self.unsupported = 0
+
+    def feed(self, sentence):
+        """Parse one sentence; returns the new Fix, or None if it carried no (valid) position."""
+        sentence = sentence.strip()
+        if not sentence.startswith("$") or len(sentence) > MAX_SENTENCE:
+            self.malformed += 1
+            return None
+        if not checksum_ok(sentence):
+            self.bad_checksum += 1
+            return None
+        self.sentences += 1
+        fields = sentence.split("*")[0].split(",")
+        handler = self._handlers.get(fields[0][3:6])  # "$GNGGA" -> "GGA", whatever the talker
+        if handler is None:
+            self.unsupported += 1
+            return None
+        try:
+            fix = handler(fields)
+        except (ValueError, IndexError):
+            self.malformed += 1
+            return None
+        if fix is not None:
+            self.fix = fix
+        return fix
+
+    def _gga(self, f):
+        # $--GGA,time,lat,N/S,lon,E/W,quality,satellites,hdop,altitude,M,...
+        self.quality = int(f[6] or 0)
+        self.hdop = _float(f[8]) or self.hdop
+        utc = self._time(f[1])
+        self._expire_speed(utc)
+        if self.quality == 0 or not f[2] or not f[4]:
+            return None
+        return Fix(nmea_degrees(f[2], f[3]), nmea_degrees(f[4], f[5]), self.speed, self.heading,
+                   self.quality, self.hdop, utc)
+
+    def _rmc(self, f):
+        # $--RMC,time,status(A/V),lat,N/S,lon,E/W,speed(knots),course,date,...
+        utc = self._time(f[1])
+        if f[2] != "A":
+            self.speed = self.heading = None  # No fix, so no speed either; don't keep the last one
+            return None
+        if not f[3] or not f[5]:
+            return None
+        if f[7]:
+            self.speed = float(f[7]) * KNOTS_TO_MS
+        if f[8]:
+            self.heading = float(f[8])
+        if f[7] or f[8]:
+            self._speed_utc = utc
+        return Fix(nmea_degrees(f[3], f[4]), nmea_degrees(f[5], f[6]), self.speed, self.heading,
+                   self.quality, self.hdop, utc)
+
+    def _vtg(self, f):
+        # $--VTG,course,T,course,M,speed,N,speed,K,...
+        if f[1]:
+            self.heading = float(f[1])
+        if f[7]:
+            self.speed = float(f[7]) / 3.6  # km/h to m/s
+        elif f[5]:
+            self.speed = float(f[5]) * KNOTS_TO_MS
+        if f[1] or f[5] or f[7]:
+            self._speed_utc = self._utc  # VTG carries no time; it belongs to the epoch just reported
+
+    def _time(self, hhmmss):
+        # Remember the newest UTC time, which dates the speed reports
+        if hhmmss:
+            self._utc = utc_seconds(hhmmss)
+            return self._utc
+        return None
+
+    def _expire_speed(self, utc):
+        if utc is None or (self.speed is None and self.heading is None):
+            return
+        if self._speed_utc is None:
+            self._speed_utc = utc  # Reported before any time was known: date it from now
+        elif (utc - self._speed_utc) % 86400 > MAX_SPEED_AGE_S:  # Modulo: across midnight too
+            self.speed = self.heading = None
+
+    def _gsa(self, f):
+        # $--GSA,mode,fix type(1 none, 2 2D, 3 3D),12 satellite ids,pdop,hdop,vdop[,system id]
+        if f[2] == "1":
+            self.quality = 0
+        if f[16]:
+            self.hdop = float(f[16])
+
+
+# Hex digit value of every byte, -1 for bytes that are not hex digits
+_HEX = np.full(256, -1, np.int16)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX[_c] = _i
+    _HEX[bytes([_c]).lower()[0]] = _i
+
+# A GGA or RMC sentence from any talker: its checksummed body, the sentence type,
+# its first eight fields and the checksum (if any)
+_POSITION = re.compile(rb"\$(..(GGA|RMC)" + rb",([^,*\r\n]*)" * 8 + rb"[^*\r\n]*)(?:\*(..))?")
+
+
+def _checksums_ok(bodies, checksums):
+    """Vectorised checksum_ok over byte-string arrays of sentence bodies and their hh checksums."""
+    # A fixed-width byte-string array is already zero-padded, and zeros are neutral for XOR
+    grid = bodies.view(np.uint8).reshape(len(bodies), -1)
+    computed = np.bitwise_xor.reduce(grid, axis=1)
+    digits = _HEX[np.char.ljust(checksums, 2).view(np.uint8).reshape(-1, 2)]
+    stated = digits[:, 0] * 16 + digits[:, 1]
+    return (checksums == b"") | ((digits >= 0).all(axis=1) & (stated == computed))
+
+
+def _floats(column):
+    """Byte-string array to floats, NaN for empty (or corrupt) fields."""
+    column = np.where(column == b"", b"nan", column)
+    try:
+        return column.astype(float)
+    except ValueError:
+        values = []
+        for value in column:
+            try:
+                values.append(float(value))
+            except ValueError:
+                values.append(np.nan)
+        return np.array(values, float)
+
+
+def _seconds(column):
+    """hhmmss.ss array to seconds since midnight, continuing past midnight instead of wrapping."""
+    value = _floats(column)
+    seconds = value // 10000 * 3600 + (value // 100) % 100 * 60 + value % 100
+    rollover = np.cumsum(np.diff(seconds, prepend=seconds[:1]) < -43200)  # Log order: a jump back of 12h+ is midnight
+    return seconds + rollover * 86400
+
+
+def _degrees(value, hemisphere, negative):
+    raw = _floats(value)
+    degrees = raw // 100 + (raw % 100) / 60
+    return np.where(hemisphere == negative, -degrees, degrees)
+
+
+def load_log(path):
+    """Parse a recorded NMEA log into a Track.
+
+    The position comes from GGA (or RMC for epochs without a GGA), speed and
+    heading from RMC, quality and HDOP from GGA; a field is NaN for epochs that
+    had no such sentence. Only epochs with a valid fix are kept. One regular
+    expression pulls the GGA and RMC fields out of the whole file and NumPy does
+    the checksums and conversions column by column, so a multi-megabyte log loads
+    several times faster than feeding it to NmeaParser line by line.
+    """
+    with (gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")) as f:
+        matches = _POSITION.findall(f.read())  # Also finds the sentences in gps_log.py's timestamped lines
+    # Fixed widths spare NumPy a pass to find the longest string; over-long sentences fail their checksum
+    widths = [MAX_SENTENCE, 3] + [16] * 8 + [2]
+    columns = [np.array(column, f"S{width}") for column, width in zip(zip(*matches), widths)] if matches \
+        else [np.array([], "S1")] * 11
+    ok = _checksums_ok(columns[0], columns[10]) if matches else np.zeros(0, bool)
+    kind, fields = columns[1], columns[2:10]
+
+    # GGA: time, lat, N/S, lon, E/W, quality, satellites, hdop
+    gga = [field[ok & (kind == b"GGA")] for field in fields]
+    gga_utc = _seconds(gga[0])
+    gga_lat = _degrees(gga[1], gga[2], b"S")
+    gga_lon = _degrees(gga[3], gga[4], b"W")
+    gga_quality = _floats(gga[5])
+    gga_hdop = _floats(gga[7])
+    keep = (gga_quality > 0) & ~np.isnan(gga_utc + gga_lat + gga_lon)
+    gga_utc, gga_lat, gga_lon, gga_quality, gga_hdop = (
+        a[keep] for a in (gga_utc, gga_lat, gga_lon, gga_quality, gga_hdop))
+
+    # RMC: time, status, lat, N/S, lon, E/W, speed (knots), course
+    rmc = [field[ok & (kind == b"RMC")] for field in fields]
+    rmc_utc = _seconds(rmc[0])
+    rmc_lat = _degrees(rmc[2], rmc[3], b"S")
+    rmc_lon = _degrees(rmc[4], rmc[5], b"W")
+    rmc_speed = _floats(rmc[6]) * KNOTS_TO_MS
+    rmc_heading = _floats(rmc[7])
+    keep = (rmc[1] == b"A") & ~np.isnan(rmc_utc + rmc_lat + rmc_lon)
+    rmc_utc, rmc_lat, rmc_lon, rmc_speed, rmc_heading = (
+        a[keep] for a in (rmc_utc, rmc_lat, rmc_lon, rmc_speed, rmc_heading))
+
+    # One row per epoch: GGA and RMC of the same second share a timestamp
+    utc = np.unique(np.concatenate([gga_utc, rmc_utc]))
+    track = {name: np.full(len(utc), np.nan) for name in Track._fields[1:]}
+    at = np.searchsorted(utc, rmc_utc)
+    track["lat"][at], track["lon"][at] = rmc_lat, rmc_lon
+    track["speed"][at], track["heading"][at] = rmc_speed, rmc_heading
+    at = np.searchsorted(utc, gga_utc)
+    track["lat"][at], track["lon"][at] = gga_lat, gga_lon  # GGA wins where both have a position
+    track["quality"][at], track["hdop"][at] = gga_quality, gga_hdop
+    return Track(utc, **track)
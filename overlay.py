@@ -0,0 +1,76 @@
+import cv2
+
+from detections import DetectionBatch
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+
+class OverlayRenderer:
+    """Draws detection boxes and short labels straight onto a frame.
+
+    A lighter stand-in for results[0].plot(), which copies the frame and
+    styles every box. This draws in place, can be limited to a few classes,
+    and caches the size of each label text so getTextSize runs once per label.
+    With burn_in=False nothing is drawn and render() only returns the
+    detections as metadata, for clients that draw the boxes themselves.
+    """
+
+    def __init__(self, classes=None, color=(0, 255, 0), colors=None, show_conf=True,
+                 font_scale=0.5, thickness=2, burn_in=True):
+        self.classes = tuple(classes) if classes is not None else None  # None draws every class
+        self.color = color
+        self.colors = colors or {}  # Optional per-class colours, {class_id: (b, g, r)}
+        self.show_conf = show_conf
+        self.font_scale = font_scale
+        self.thickness = thickness
+        self.burn_in = burn_in
+        self._text_sizes = {}  # label -> ((width, height), baseline)
+
+    def _text_size(self, label):
+        size = self._text_sizes.get(label)
+        if size is None:
+            size = cv2.getTextSize(label, FONT, self.font_scale, 1)
+            if len(self._text_sizes) < 4096:  # Confidences are rounded, so the set of labels stays small
+                self._text_sizes[label] = size
+        return size
+
+    def select(self, results):
+        """The detections this renderer shows, as a DetectionBatch."""
+        detections = results if isinstance(results, DetectionBatch) else DetectionBatch.from_results(results)
+        if self.classes is not None:
+            detections = detections.only(*self.classes)
+        return detections
+
+    def draw(self, image, detections):
+        """Draw a DetectionBatch onto image in place."""
+        names = detections.names
+        boxes = detections.xyxy.astype(int).tolist()
+        for (x1, y1, x2, y2), cls, conf in zip(boxes, detections.classes.tolist(), detections.scores.tolist()):
+            color = self.colors.get(cls, self.color)
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, self.thickness)
+            label = names.get(cls, str(cls))
+            if self.show_conf:
+                label = f"{label} {conf:.2f}"
+            (width, height), baseline = self._text_size(label)
+            # Filled tab above the box (or inside it at the top edge) so the text stays readable
+            top = y1 - height - baseline if y1 - height - baseline >= 0 else y1
+            cv2.rectangle(image, (x1, top), (x1 + width, top + height + baseline), color, -1)
+            cv2.putText(image, label, (x1, top + height), FONT, self.font_scale, (0, 0, 0), 1, cv2.LINE_AA)
+        return image
+
+    def metadata(self, detections, frame_id=None):
+        """The detections as plain JSON-serialisable data."""
+        names = detections.names
+        return {
+            "frame_id": frame_id,
+            "boxes": [[round(v, 1) for v in box] for box in detections.xyxy.tolist()],
+            "classes": [names.get(c, str(c)) for c in detections.classes.tolist()],
+            "scores": [round(s, 3) for s in detections.scores.tolist()],
+        }
+
+    def render(self, image, results, frame_id=None):
+        """Draw the selected detections onto image (unless burn_in is off) and return them as metadata."""
+        detections = self.select(results)
+        if self.burn_in:
+            self.draw(image, detections)
+        return self.metadata(detections, frame_id)
@@ -1,50 +1,88 @@
-from flask import Flask, Response
-import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
+from flask import Flask, Response, jsonify, request
+import time
+from frame_source import open_source
+from model_registry import load_model, model_timings
+from frame_broadcaster import FrameBroadcaster
+from overlay import OverlayRenderer
+from stream_quality import StreamStats
+from video_socket import StreamFrame
+from async_server import serve, mjpeg_route
 
 app = Flask(__name__)
 
 # Set up the camera with Picamera
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
 # Load YOLO model
-model = YOLO("yolov8n_ncnn_model")
+model = load_model("yolov8n_ncnn_model")  # Loads and warms up in the background
 
-def gen_frames():
-    while True:
-        # Capture a frame from the camera
-        frame = picam2.capture_array()
+# Set to False to stream clean frames and serve the boxes from /detections instead of drawing them
+BURN_IN_DETECTIONS = True
+overlay = OverlayRenderer(burn_in=BURN_IN_DETECTIONS)
+latest_detections = {"frame_id": None, "boxes": [], "classes": [], "scores": []}
+frame_count = 0
 
-        # Run YOLO model on the captured frame and store the results
-        results = model(frame)
+stream_stats = StreamStats()  # Per-client JPEG quality, size and bytes sent
 
-        # Annotate the frame with the detection data
-        annotated_frame = results[0].plot()
+def produce_frame():
+    """Capture, run inference and annotate one frame for every viewer to share."""
+    global latest_detections, frame_count
+    # Each frame gets its own array: clients at different quality levels encode from it
+    # after the producer has moved on (each level is encoded once, see StreamFrame)
+    frame = picam2.capture_array()
 
-        # Convert frame to JPEG format to stream it over HTTP
-        ret, buffer = cv2.imencode('.jpg', annotated_frame)
-        if not ret:
+    # Run YOLO model on the captured frame and store the results
+    results = model(frame)
+
+    # Annotate the frame in place with the detection data (or just keep it as metadata)
+    frame_count += 1
+    latest_detections = overlay.render(frame, results, frame_count)
+    return StreamFrame(frame, latest_detections)
+
+# One producer serves every client, so extra viewers don't cost extra inference
+broadcaster = FrameBroadcaster(produce_frame).start()
+
+def gen_frames(stream):
+    # Each client always gets the newest frame; stale ones are skipped
+    for frame in broadcaster.subscribe():
+        # Encoded at this client's quality level (shared with other clients on the same level)
+        frame_bytes = frame.jpeg(quality=stream.quality, scale=stream.scale)
+        if frame_bytes is None:
             continue
-        
         # Yield the frame in the correct format for MJPEG streaming
-        frame_bytes = buffer.tobytes()
+        started = time.monotonic()
         yield (b'--frame\r\n'
                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n\r\n')
+        # Resumed once the chunk is written, so this measures how fast the client takes frames
+        stream.record(len(frame_bytes), time.monotonic() - started)
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen_frames(),
-                    mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Optional ?fps=...&kbps=... set this client's targets; quality and size adapt to its link
+    stream = stream_stats.open("mjpeg", request.args)
+    response = Response(gen_frames(stream), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.call_on_close(lambda: stream_stats.close(stream))  # Runs when the client disconnects
+    return response
+
+@app.route('/stream_stats')
+def stream_stats_route():
+    """Quality level, frame rate and bytes sent for every streaming client."""
+    return jsonify(stream_stats.report())
+
+@app.route('/detections')
+def detections():
+    """Boxes, class names and scores of the newest frame, for clients that draw the overlay themselves."""
+    return jsonify(latest_detections)
+
+@app.route('/model_status')
+def model_status():
+    """Model load and warm-up times, and whether it is ready yet."""
+    return jsonify(model_timings())
 
 @app.route('/')
 def index():
     return "Flask server is running. Go to /video_feed for the video stream."
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5050)
+    # The video stream runs as a coroutine on an asyncio server; Flask's threads only serve short requests
+    serve(app, [mjpeg_route('/video_feed', broadcaster, stream_stats)], port=5050)
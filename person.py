@@ -1,67 +1,74 @@
 from flask import Flask, render_template, Response, request, jsonify
 import cv2
-import serial
-from picamera2 import Picamera2
-from ultralytics import YOLO
-import threading
+from frame_source import open_source
+from model_registry import load_model, model_timings
+from detections import DetectionBatch, DetectionCache
+from stream_quality import StreamStats
+from frame_broadcaster import FrameBroadcaster
+from video_socket import StreamFrame
+from async_server import serve, mjpeg_route
+import time
 
 app = Flask(__name__)
 
 # Initialize Camera and Model
-picam2 = Picamera2()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
-# Configure camera
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
-
-model = YOLO("yolov8n_ncnn_model")
+model = load_model("yolov8n_ncnn_model")  # Loads and warms up in the background
 
 selected_human = None
 human_class_id = 0  # COCO class ID for 'person'
+detection_cache = DetectionCache()  # Humans detected in the last few streamed frames, for /select_person
+stream_stats = StreamStats()  # Per-client JPEG quality, size and bytes sent
 
 
-def generate_frames():
+def detect_frame():
+    """Capture and detect one frame, draw the boxes and work out the movement command."""
     global selected_human
-    while True:
-        # Capture frame
-        frame = picam2.capture_array()
-        results = model(frame, imgsz=320)
+    # Capture frame
+    frame = picam2.capture_array()
+    results = model(frame, imgsz=320)
+    
+    humans = DetectionBatch.from_results(results).only(human_class_id)
+    frame_id = detection_cache.publish(humans)
+    for x1, y1, x2, y2 in humans.xyxy.astype(int).tolist():
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+    
+    if selected_human:
+        x1, y1, x2, y2 = selected_human
+        cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
         
-        detected_humans = []
-        for result in results[0].boxes:
-            if int(result.cls) == human_class_id:
-                x1, y1, x2, y2 = result.xyxy[0].tolist()
-                detected_humans.append((x1, y1, x2, y2))
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (255, 0, 0), 2)
+        # Movement logic
+        center_x = (x1 + x2) // 2
+        frame_center_x = frame.shape[1] // 2
+        threshold = 50
         
-        if selected_human:
-            x1, y1, x2, y2 = selected_human
-            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 255, 0), 2)
-            
-            # Movement logic
-            center_x = (x1 + x2) // 2
-            frame_center_x = frame.shape[1] // 2
-            threshold = 50
-            
-            if center_x < frame_center_x - threshold:
-                movement = "L"  # Left
-            elif center_x > frame_center_x + threshold:
-                movement = "R"  # Right
-            else:
-                movement = "F"  # Forward
-            
-            print(f"Movement Command: {movement}")  # Print command instead of sending to Arduino
+        if center_x < frame_center_x - threshold:
+            movement = "L"  # Left
+        elif center_x > frame_center_x + threshold:
+            movement = "R"  # Right
         else:
-            print("Movement Command: S")  # Print 'Stop' command
+            movement = "F"  # Forward
+        
+        print(f"Movement Command: {movement}")  # Print command instead of sending to Arduino
+    else:
+        print("Movement Command: S")  # Print 'Stop' command
+
+    return StreamFrame(frame, {"frame_id": frame_id})
+
+# One loop captures and detects for every viewer (paused while nobody is watching)
+broadcaster = FrameBroadcaster(detect_frame).start()
 
-        # Convert frame to jpeg
-        _, buffer = cv2.imencode('.jpg', frame)
-        frame = buffer.tobytes()
+def generate_frames(stream):
+    for frame in broadcaster.subscribe():
+        jpeg = frame.jpeg(quality=stream.quality, scale=stream.scale)  # Shared with clients on the same level
+        if jpeg is None:
+            continue
+        started = time.monotonic()
         yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+               b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        # Resumed once the chunk is written, so this measures how fast the client takes frames
+        stream.record(len(jpeg), time.monotonic() - started)
 
 
 @app.route('/')
@@ -69,9 +76,25 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/model_status')
+def model_status():
+    """Model load and warm-up times, and whether it is ready yet."""
+    return jsonify(model_timings())
+
+
 @app.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # Optional ?fps=...&kbps=... set this client's targets; quality and size adapt to its link
+    stream = stream_stats.open("mjpeg", request.args)
+    response = Response(generate_frames(stream), mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.call_on_close(lambda: stream_stats.close(stream))
+    return response
+
+
+@app.route('/stream_stats')
+def stream_stats_route():
+    """Quality level, frame rate and bytes sent for every streaming client."""
+    return jsonify(stream_stats.report())
 
 
 @app.route('/select_person', methods=['POST'])
@@ -80,16 +103,20 @@ def select_person():
     data = request.get_json()
     x, y = data['x'], data['y']
     
+    # Hit-test against the detections of the frame the client saw (or the newest one); no new capture or model call
+    frame_id, humans = detection_cache.get(data.get('frame_id'))
+    if humans is None:
+        return jsonify({"status": "No person found"})
+
     # Check if click is inside a detected human box
-    for result in model(picam2.capture_array(), imgsz=320)[0].boxes:
-        if int(result.cls) == human_class_id:
-            x1, y1, x2, y2 = result.xyxy[0].tolist()
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                selected_human = (x1, y1, x2, y2)
-                return jsonify({"status": "Person selected"})
+    index = humans.containing(x, y)
+    if index is not None:
+        selected_human = humans.box(index)
+        return jsonify({"status": "Person selected", "frame_id": frame_id})
     
-    return jsonify({"status": "No person found"})
+    return jsonify({"status": "No person found", "frame_id": frame_id})
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # The video stream runs as a coroutine on an asyncio server; Flask's threads only serve short requests
+    serve(app, [mjpeg_route('/video_feed', broadcaster, stream_stats)], port=5000)
@@ -0,0 +1,255 @@
+import threading
+import time
+
+import cv2
+
+from frame_ring import FrameRing
+from frame_source import EndOfStream
+from metrics import FpsMeter
+from overlay import OverlayRenderer
+
+# Used by draw_detections and by pipelines that don't bring their own overlay
+default_overlay = OverlayRenderer()
+
+
+class LatestSlot:
+    """Single-slot queue that only keeps the newest item; put() never blocks."""
+
+    def __init__(self, on_drop=None):
+        self.on_drop = on_drop  # Called with each item that gets overwritten
+        self._cond = threading.Condition()
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self.dropped = 0  # Items overwritten before anyone took them
+
+    def put(self, item):
+        with self._cond:
+            stale = self._item if self._has_item else None
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+        if stale is not None and self.on_drop is not None:
+            self.on_drop(stale)
+
+    def get(self, timeout=None):
+        """Take the newest item, waiting up to timeout seconds. Returns None on timeout or close."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._has_item or self._closed, timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class CapturedFrame:
+    """A frame together with its id, monotonic capture time and the ring buffer it lives in."""
+
+    __slots__ = ("frame_id", "captured_at", "image", "ring", "slot")
+
+    def __init__(self, frame_id, captured_at, image, ring=None, slot=None):
+        self.frame_id = frame_id
+        self.captured_at = captured_at
+        self.image = image
+        self.ring = ring
+        self.slot = slot
+
+    def release(self):
+        """Hand the buffer back to the ring once nobody needs the pixels any more."""
+        if self.ring is not None and self.slot is not None:
+            self.ring.release(self.slot)
+            self.slot = None
+
+
+class DetectionPipeline:
+    """Capture thread -> inference worker -> output stage, linked by latest-only slots.
+
+    The camera keeps capturing while the model runs, and the model starts on the
+    newest frame as soon as it is free, so throughput approaches the pure
+    inference rate. The output stage (annotation, callbacks, display) runs on
+    the calling thread because cv2.imshow must stay on the main thread.
+
+    Frames are captured into a preallocated FrameRing, the model reads them in
+    place and boxes are drawn onto the same buffer, so the only full-frame copy
+    is the one out of the camera (see ring.report()).
+    """
+
+    def __init__(self, source, model, handle_results=None, model_kwargs=None,
+                 window_name="Camera", show=True, ring_slots=6, report_on_exit=True,
+                 motion_gate=None, scheduler=None, overlay=None, handle_skipped=None):
+        self.source = source  # Frame source (see frame_source.py)
+        self.ring = FrameRing(source.shape, slots=ring_slots)
+        self.model = model
+        self.handle_results = handle_results  # Optional callback(frame, results) run in the output stage
+        self.model_kwargs = model_kwargs or {}
+        self.window_name = window_name
+        self.show = show
+        self.report_on_exit = report_on_exit
+        self.motion_gate = motion_gate  # Optional MotionGate that reuses detections on static frames
+        self.scheduler = scheduler  # Optional object whose should_infer(image) picks which frames to run at all
+        self.handle_skipped = handle_skipped  # Optional callback(frame) for frames the scheduler skipped
+        self.overlay = overlay or default_overlay  # OverlayRenderer that draws the detections on the display
+
+        self.frames = LatestSlot(on_drop=CapturedFrame.release)  # capture -> inference
+        self.results = LatestSlot(on_drop=lambda item: item[0].release())  # inference -> output
+        self._running = False
+        self._threads = []
+
+        # Simple counters for checking the pipeline is keeping up
+        self.stats = {"captured": 0, "inferred": 0, "output": 0, "frame_age_ms": 0.0}
+        self.fps_meter = FpsMeter()  # Rate of frames that made it all the way through
+
+    def _capture_loop(self):
+        frame_id = 0
+        while self._running:
+            try:
+                captured = self.ring.capture(self.source, timeout=0.5)
+            except EndOfStream:
+                break  # A replay source ran out of frames
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                time.sleep(0.1)
+                continue
+            if captured is None:
+                continue  # Every buffer is still in use downstream
+            slot, image = captured
+            frame_id += 1
+            self.stats["captured"] += 1
+            self.frames.put(CapturedFrame(frame_id, time.monotonic(), image, self.ring, slot))
+        self.frames.close()
+
+    def _inference_loop(self):
+        while self._running:
+            frame = self.frames.get(timeout=0.5)
+            if frame is None:
+                if self.frames.closed:
+                    break
+                continue
+            if self.scheduler is not None and not self.scheduler.should_infer(frame.image):
+                # Not due for inference: still pass the frame on so the display keeps moving
+                self.results.put((frame, None))
+                continue
+            try:
+                if self.motion_gate is not None:
+                    results = self.motion_gate.run(self.model, frame.image, **self.model_kwargs)
+                else:
+                    results = self.model(frame.image, **self.model_kwargs)
+            except Exception as e:
+                print(f"Error running inference: {e}")
+                frame.release()
+                continue
+            self.stats["inferred"] += 1
+            self.results.put((frame, results))
+        self.results.close()
+
+    def start(self):
+        self._running = True
+        self._threads = [
+            threading.Thread(target=self._capture_loop, daemon=True),
+            threading.Thread(target=self._inference_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self.frames.close()
+        self.results.close()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def output(self, frame, results):
+        """Annotate, run the result callback and display one frame (results is None if it was skipped)."""
+        # How old the frame is by the time we act on its detections
+        self.stats["frame_age_ms"] = (time.monotonic() - frame.captured_at) * 1000
+        self.fps_meter.tick()
+
+        if results is None:
+            if self.handle_skipped is not None:
+                self.handle_skipped(frame)
+        elif self.handle_results is not None:
+            self.handle_results(frame, results)
+
+        if not self.show:
+            return True
+
+        # Draw the detections straight onto the frame's own ring buffer
+        annotated_frame = frame.image
+        if results is not None:
+            self.overlay.render(annotated_frame, results, frame.frame_id)
+        draw_fps(annotated_frame, self.fps_meter.fps)
+
+        # Display the resulting frame
+        cv2.imshow(self.window_name, annotated_frame)
+
+        # Exit the program if q is pressed
+        return cv2.waitKey(1) != ord("q")
+
+    def run(self):
+        """Run the pipeline until q is pressed (or forever when not showing a window)."""
+        self.start()
+        try:
+            while True:
+                item = self.results.get(timeout=0.5)
+                if item is None:
+                    if self.results.closed:
+                        break  # The source ran out and everything has been shown
+                    if self.show and cv2.waitKey(1) == ord("q"):
+                        break
+                    continue
+                self.stats["output"] += 1
+                if self.motion_gate is not None and self.stats["output"] % 1000 == 0:
+                    print(f"Motion gate: {self.motion_gate.report()}")
+                frame, results = item
+                try:
+                    keep_going = self.output(frame, results)
+                finally:
+                    frame.release()
+                if not keep_going:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            if self.report_on_exit:
+                print(f"Frame buffers: {self.ring.report()}")
+                if self.motion_gate is not None:
+                    print(f"Motion gate: {self.motion_gate.report()}")
+                if self.scheduler is not None:
+                    print(f"Scheduler: {self.scheduler.report()}")
+
+
+def draw_detections(image, results, overlay=None):
+    """Draw boxes and labels onto image in place (results[0].plot() copies the frame first)."""
+    (overlay or default_overlay).render(image, results)
+    return image
+
+
+def draw_fps(annotated_frame, fps):
+    """Draw the end-to-end FPS in the top-right corner of the frame."""
+    # Measured over whole frames (capture to display), not just the model's inference time
+    text = f'FPS: {fps:.1f}'
+
+    # Define font and position
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    text_size = cv2.getTextSize(text, font, 1, 2)[0]
+    text_x = annotated_frame.shape[1] - text_size[0] - 10  # 10 pixels from the right
+    text_y = text_size[1] + 10  # 10 pixels from the top
+
+    # Draw the text on the annotated frame
+    cv2.putText(annotated_frame, text, (text_x, text_y), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
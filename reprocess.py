@@ -0,0 +1,217 @@
+"""Re-run the road-damage model over a recorded drive and load the detections into the database.
+
+Example:
+    python reprocess.py drive.mp4 drive_gps.log --workers 4 --db sqlite:road.db
+    python reprocess.py drive.mp4 drive_gps.log --model YOLOv8_Small_RDD_ncnn_model --db mysql
+
+The video is split into chunks of frames that are processed by a pool of
+worker processes, each with its own model instance. Every detection is
+geotagged by interpolating the GPS log at the frame's time, and each finished
+chunk is bulk-inserted into detected_road_conditions. Finished chunks are
+recorded in a checkpoint file, so an interrupted run picks up where it stopped.
+
+The checkpoint also records the video, model, chunk size, frame size and ROI;
+resuming with different ones is refused (use --restart to start over). Every
+row carries the video, frame number and box index within the frame under a
+unique key, and is inserted with INSERT OR IGNORE (MySQL: INSERT IGNORE), so a
+chunk that is processed twice never adds duplicate rows. A MySQL table needs
+these columns first:
+    ALTER TABLE detected_road_conditions ADD video VARCHAR(255), ADD frame INT, ADD box INT,
+        ADD UNIQUE KEY video_frame_box (video, frame, box);
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import cv2
+import numpy as np
+
+from detections import DetectionBatch
+from frame_source import EndOfStream, VideoFileSource
+from nmea import load_log, utc_seconds
+
+CLASS_NAMES = {0: "Crack", 1: "Potholes"}  # Same mapping as road_with_gps.py
+
+# Set by init_worker in each pool process
+worker_model = None
+worker_options = None
+
+
+def init_worker(model_path, options):
+    """Load one model per worker process."""
+    global worker_model, worker_options
+    from model_registry import load_model
+    from roi import RoadRegionModel
+
+    worker_options = options
+    model = load_model(model_path, background=False)
+    worker_model = RoadRegionModel(model, roi=options["roi"]) if options["roi"] else model
+
+
+def process_chunk(chunk):
+    """Run the model over frames [start, end) and return the raw detections."""
+    start, end = chunk
+    options = worker_options
+    source = VideoFileSource(options["video"], size=options["size"], pace="fast")
+    source.capture.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    detections = []
+    index = start
+    batch, batch_indices = [], []
+    began = time.perf_counter()
+    while index < end:
+        try:
+            batch.append(source.capture_array())
+        except EndOfStream:
+            break
+        batch_indices.append(index)
+        index += 1
+        if len(batch) == options["batch"] or index == end:
+            detections.extend(_detect(batch, batch_indices))
+            batch, batch_indices = [], []
+    if batch:
+        detections.extend(_detect(batch, batch_indices))
+    source.stop()
+    return start, index - start, detections, time.perf_counter() - began
+
+
+def _detect(frames, indices):
+    """Run the model on a batch of frames in one call, keeping only road-damage classes."""
+    results = worker_model(frames, verbose=False)  # The road-region wrapper batches every frame's tiles
+    found = []
+    for frame_index, result in zip(indices, results):
+        damage = DetectionBatch.from_results([result]).only(*CLASS_NAMES)
+        for box, (name, conf) in enumerate(zip(damage.labels(CLASS_NAMES), damage.scores.tolist())):
+            found.append((frame_index, box, name, conf))
+    return found
+
+
+def open_database(spec):
+    """Open the output database. spec is 'mysql' or 'sqlite:path/to/file.db'."""
+    columns = "name, latitude, longitude, video, frame, box"
+    if spec.startswith("sqlite:"):
+        db = sqlite3.connect(spec[len("sqlite:"):])
+        db.execute("CREATE TABLE IF NOT EXISTS detected_road_conditions "
+                   "(id INTEGER PRIMARY KEY, name TEXT, latitude REAL, longitude REAL)")
+        # Tables from before the unique key get its columns added
+        existing = {row[1] for row in db.execute("PRAGMA table_info(detected_road_conditions)")}
+        for column, kind in (("video", "TEXT"), ("frame", "INTEGER"), ("box", "INTEGER")):
+            if column not in existing:
+                db.execute(f"ALTER TABLE detected_road_conditions ADD COLUMN {column} {kind}")
+        db.execute("CREATE UNIQUE INDEX IF NOT EXISTS video_frame_box ON detected_road_conditions (video, frame, box)")
+        return db, f"INSERT OR IGNORE INTO detected_road_conditions ({columns}) VALUES (?, ?, ?, ?, ?, ?)"
+    import mysql.connector
+    db = mysql.connector.connect(host="localhost", user="hasin", password="12345678", database="road")
+    return db, f"INSERT IGNORE INTO detected_road_conditions ({columns}) VALUES (%s, %s, %s, %s, %s, %s)"
+
+
+def load_checkpoint(path, settings):
+    """Chunks already done by a run with the same settings; None if the checkpoint is from other settings."""
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("settings") != settings:
+        return None  # Chunk boundaries or detections would differ from the recorded run
+    return set(checkpoint["done"])
+
+
+def save_checkpoint(path, settings, done):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"settings": settings, "done": sorted(done)}, f)
+    os.replace(tmp, path)  # Atomic, so a crash never leaves a half-written checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocess a recorded drive with the road-damage model")
+    parser.add_argument("video", help="recorded video of the drive")
+    parser.add_argument("gps_log", help="NMEA log recorded during the drive")
+    parser.add_argument("--model", default="YOLOv8_Small_RDD_ncnn_model")
+    parser.add_argument("--db", default="mysql", help="'mysql' or 'sqlite:path/to/file.db'")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=300, help="frames per work item")
+    parser.add_argument("--batch", type=int, default=8, help="frames per model call")
+    parser.add_argument("--size", type=int, nargs=2, default=(320, 320), metavar=("W", "H"))
+    parser.add_argument("--roi", default="0,0.45,1,1", help="road region as x1,y1,x2,y2 fractions, or 'none'")
+    parser.add_argument("--start-utc", help="UTC time of the first video frame (hhmmss.ss); "
+                                            "defaults to the first fix in the GPS log")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <video>.checkpoint.json)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and process every chunk")
+    args = parser.parse_args()
+
+    track = load_log(args.gps_log)
+    times, lats, lons = track.utc, track.lat, track.lon
+    if not len(times):
+        parser.error(f"No GPS fixes found in {args.gps_log}")
+    start_utc = utc_seconds(args.start_utc) if args.start_utc else times[0]
+
+    probe = cv2.VideoCapture(args.video)
+    total_frames = int(probe.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = probe.get(cv2.CAP_PROP_FPS) or 30.0
+    probe.release()
+
+    roi = None if args.roi == "none" else tuple(float(v) for v in args.roi.split(","))
+    video = os.path.abspath(args.video)  # Also the video's key in the database
+    settings = {"video": video, "model": args.model, "chunk": args.chunk, "size": list(args.size),
+                "roi": list(roi) if roi else None}
+    checkpoint_path = args.checkpoint or args.video + ".checkpoint.json"
+    done = set() if args.restart else load_checkpoint(checkpoint_path, settings)
+    if done is None:
+        parser.error(f"{checkpoint_path} is from a run with other settings; "
+                     f"rerun with those, or pass --restart to start over")
+    chunks = [(s, min(s + args.chunk, total_frames)) for s in range(0, total_frames, args.chunk)]
+    pending = [c for c in chunks if c[0] not in done]
+    print(f"{total_frames} frames at {fps:.1f} FPS, {len(pending)}/{len(chunks)} chunks to do "
+          f"on {args.workers} workers")
+
+    options = {"video": args.video, "size": tuple(args.size), "batch": args.batch, "roi": roi}
+    db, query = open_database(args.db)
+    cursor = db.cursor()
+
+    frames_done = 0
+    rows_written = 0
+    untagged = 0
+    began = time.perf_counter()
+    with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(args.model, options)) as pool:
+        for start, count, detections, seconds in pool.imap_unordered(process_chunk, pending):
+            # Geotag every detection in the chunk at once
+            rows = []
+            if detections:
+                frame_times = start_utc + np.array([d[0] for d in detections]) / fps
+                inside = (frame_times >= times[0]) & (frame_times <= times[-1])
+                det_lats = np.interp(frame_times, times, lats)
+                det_lons = np.interp(frame_times, times, lons)
+                for (frame, box, name, _), ok, lat, lon in zip(detections, inside, det_lats, det_lons):
+                    if ok:
+                        rows.append((name, float(lat), float(lon), video, frame, box))
+                    else:
+                        untagged += 1  # Outside the GPS log, no trustworthy position
+            inserted = 0
+            if rows:
+                cursor.executemany(query, rows)
+                inserted = max(cursor.rowcount, 0)  # Rows stored by an earlier run are ignored
+            db.commit()
+
+            # Only mark the chunk done once its rows are committed
+            done.add(start)
+            save_checkpoint(checkpoint_path, settings, done)
+            frames_done += count
+            rows_written += inserted
+            print(f"Frames {start}-{start + count}: {len(rows)} detections ({count / seconds:.1f} FPS in worker)")
+
+    elapsed = time.perf_counter() - began
+    cursor.close()
+    db.close()
+
+    overall_fps = frames_done / elapsed if elapsed > 0 else 0.0
+    print(f"\nProcessed {frames_done} frames in {elapsed:.1f} s: {overall_fps:.1f} FPS total, "
+          f"{overall_fps / args.workers:.2f} FPS per core")
+    print(f"Wrote {rows_written} detections, skipped {untagged} outside the GPS log")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,26 @@
 import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
+from frame_source import open_source
+from model_registry import load_model
+from pipeline import DetectionPipeline
+from roi import RoadRegionModel, CAPTURE_SIZE
+from motion_gate import MotionGate
+from overlay import OverlayRenderer
 
 # Set up the camera with Picam
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320,320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source(size=CAPTURE_SIZE)  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
 # Load our YOLOv8 model
-model = YOLO("YOLOv8_Small_RDD_ncnn_model")
+model = RoadRegionModel.from_env(load_model("YOLOv8_Small_RDD_ncnn_model"))  # Road region only (ROAD_ROI, ROAD_TILED in roi.py)
 
-while True:
-    # Capture a frame from the camera
-    frame = picam2.capture_array()
-    
-    # Run YOLO model on the captured frame and store the results
-    results = model(frame)
-    
-    # Output the visual detection data, we will draw this on our camera preview window
-    annotated_frame = results[0].plot()
-    
-    # Get inference time
-    inference_time = results[0].speed['inference']
-    fps = 1000 / inference_time  # Convert to milliseconds
-    text = f'FPS: {fps:.1f}'
+# Reuse the last detections while the scene is static (parked rover), but re-check at least every 30 frames
+gate = MotionGate(threshold=2.0, refresh_every=30)
 
-    # Define font and position
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    text_size = cv2.getTextSize(text, font, 1, 2)[0]
-    text_x = annotated_frame.shape[1] - text_size[0] - 10  # 10 pixels from the right
-    text_y = text_size[1] + 10  # 10 pixels from the top
-
-    # Draw the text on the annotated frame
-    cv2.putText(annotated_frame, text, (text_x, text_y), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
-
-    # Display the resulting frame
-    cv2.imshow("Camera", annotated_frame)
-
-    # Exit the program if q is pressed
-    if cv2.waitKey(1) == ord("q"):
-        break
+# Capture, inference and display run as separate stages so none of them waits on the others
+# Cracks in yellow, potholes in red
+overlay = OverlayRenderer(colors={0: (0, 255, 255), 1: (0, 0, 255)})
+pipeline = DetectionPipeline(picam2, model, motion_gate=gate, overlay=overlay)
+pipeline.run()
 
 # Close all windows
 cv2.destroyAllWindows()
+picam2.stop()
@@ -1,21 +1,22 @@
+import atexit
 import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
+from frame_source import open_source
+from model_registry import load_model
 import mysql.connector
-import threading
-import time
-import serial
+from pipeline import DetectionPipeline
+from detections import DetectionBatch
+from overlay import OverlayRenderer
+from roi import RoadRegionModel, CAPTURE_SIZE
+from survey import SurveyScheduler
+from gps_reader import open_gps_reader
+from db_writer import BatchWriter
+from dedup import DetectionDeduplicator, GroundProjection, event_insert
 
 # Set up the camera with Picam
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source(size=CAPTURE_SIZE)  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
 # Load the YOLOv8 model
-model = YOLO("YOLOv8_Small_RDD_ncnn_model")
+model = RoadRegionModel.from_env(load_model("YOLOv8_Small_RDD_ncnn_model"))  # Road region only (ROAD_ROI, ROAD_TILED in roi.py)
 
 # Set up MySQL database connection
 db = mysql.connector.connect(
@@ -24,133 +25,83 @@ db = mysql.connector.connect(
     password="12345678",     # Your database password
     database="road"          # Your database name
 )
-cursor = db.cursor()
 
-# Lock for thread-safe database operations
-db_lock = threading.Lock()
+# Also store first/last seen, best confidence and hits per crack or pothole (needs those columns, see dedup.py)
+STORE_EVENT_DETAILS = False
+
+# Detections are inserted in batches by a writer thread, so inference never waits on MySQL
+writer = BatchWriter(db, event_insert("detected_road_conditions", STORE_EVENT_DETAILS),
+                     name="detected_road_conditions").start()
 
 # GPS Serial port setup (Assuming GPS module connected to /dev/serial0, adjust based on your setup)
-gps_port = "/dev/ttyACM1"  # Replace with the correct port for your GPS
-ser = serial.Serial(gps_port, baudrate=9600, timeout=1)
-
-# Global variables to store GPS coordinates
-latitude = None
-longitude = None
-
-def store_detection(name, latitude, longitude):
-    """Store detection result into the MySQL database."""
-    try:
-        query = "INSERT INTO detected_road_conditions (name, latitude, longitude) VALUES (%s, %s, %s)"
-        values = (name, latitude, longitude)
-        
-        with db_lock:
-            cursor.execute(query, values)
-            db.commit()
-            print(f"Saved detection of {name} at ({latitude}, {longitude})")
-    except Exception as e:
-        print(f"Error saving detection to DB: {e}")
-
-def parse_gps_data(data):
-    """Parse the NMEA sentence to extract latitude and longitude."""
-    global latitude, longitude
-    try:
-        parts = data.split(",")
-        
-        # Handle $GPGGA sentence: Global Positioning System Fix Data
-        if parts[0] == "$GPGGA":
-            # Ensure there are enough parts and check if latitude and longitude are available
-            if len(parts) >= 6 and parts[2] and parts[4]:
-                lat_deg = float(parts[2]) // 100  # Degrees (before the dot)
-                lat_min = float(parts[2]) % 100  # Minutes (after the dot)
-                lon_deg = float(parts[4]) // 100  # Degrees (before the dot)
-                lon_min = float(parts[4]) % 100  # Minutes (after the dot)
-                
-                # Convert minutes to decimal degrees
-                lat = lat_deg + (lat_min / 60)
-                lon = lon_deg + (lon_min / 60)
-                
-                # Apply direction
-                if parts[3] == "S":  # South hemisphere
-                    lat = -lat
-                if parts[5] == "W":  # West hemisphere
-                    lon = -lon
-
-                latitude = lat
-                longitude = lon
-                print(f"GPS - Latitude: {lat}, Longitude: {lon}")
-            else:
-                print("Invalid data in $GPGGA sentence (missing latitude or longitude).")
-                
-    except Exception as e:
-        print(f"Error parsing GPS data: {e}")
-
-def read_gps_data():
-    """Read and process GPS data indefinitely."""
-    try:
-        while True:
-            data = ser.readline()
-            if data:
-                decoded_data = data.decode('utf-8').strip()  # Decode the data
-                parse_gps_data(decoded_data)  # Parse the NMEA sentence for GPS info
-            time.sleep(1)  # Delay to avoid overwhelming the output
-    except Exception as e:
-        print(f"Error reading GPS data: {e}")
-
-# Start the GPS reading in a separate thread
-gps_thread = threading.Thread(target=read_gps_data)
-gps_thread.daemon = True  # Allows the thread to exit when the main program ends
-gps_thread.start()
-
-while True:
-    # Capture a frame from the camera
-    frame = picam2.capture_array()
-    
-    # Run YOLO model on the captured frame
-    results = model(frame)
-    
-    # Annotate the frame with detection results
-    annotated_frame = results[0].plot()
-
-    # Get inference time and FPS
-    inference_time = results[0].speed['inference']
-    fps = 1000 / inference_time  # Convert to milliseconds
-    text = f'FPS: {fps:.1f}'
-    
-    # Define font and position for FPS display
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    text_size = cv2.getTextSize(text, font, 1, 2)[0]
-    text_x = annotated_frame.shape[1] - text_size[0] - 10  # 10 pixels from the right
-    text_y = text_size[1] + 10  # 10 pixels from the top
-
-    # Draw FPS text on the frame
-    cv2.putText(annotated_frame, text, (text_x, text_y), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
-
-    # Loop through detections to check for the class labels
-    for obj in results[0].boxes:
-        # Get the label (class) of the detected object
-        label = int(obj.cls[0])  # Convert to int
-        
-        # Check if the detected object is one of the classes and categorize them
-        if label == 0:  # Longitudinal Crack, Transverse Crack, Alligator Crack -> Crack
-            name = "Crack"
-        elif label == 1:  # Potholes
-            name = "Potholes"
-        else:
-            continue
-        
-        # Store the detection in the database with latitude and longitude
-        if latitude is not None and longitude is not None:
-            store_detection(name, latitude, longitude)  # Store the detection in the database
-
-    # Display the annotated frame
-    cv2.imshow("Camera", annotated_frame)
-
-    # Exit the program if 'q' is pressed
-    if cv2.waitKey(1) == ord("q"):
-        break
+gps_port = "/dev/ttyACM1"  # Replace with the correct port for your GPS (GPS_PORT overrides it, e.g. a replay)
+
+# Past the newest fix, positions are extrapolated from its speed and heading for at most this many seconds
+MAX_EXTRAPOLATE_S = 1.5
+
+# Model classes we store: Longitudinal/Transverse/Alligator Crack -> Crack, and Potholes
+ROAD_CLASSES = {0: "Crack", 1: "Potholes"}
+
+# Survey mode: run the model once every SURVEY_SPACING_M metres of road, and not at all below SURVEY_MIN_SPEED_KMH
+SURVEY_MODE = True
+SURVEY_SPACING_M = 5.0
+SURVEY_MIN_SPEED_KMH = 3.0
+survey = SurveyScheduler(spacing_m=SURVEY_SPACING_M, min_speed_kmh=SURVEY_MIN_SPEED_KMH)
+
+# Height of the camera above the road, for placing detections on the road (adjust to your mount)
+CAMERA_HEIGHT_M = 1.2
+
+# A pothole stays in view for many frames: merge its sightings and store it once, when it is out of view.
+# Survey frames are metres apart and rarely overlap, so sightings are also matched by where they are on the road.
+dedup = DetectionDeduplicator(ROAD_CLASSES, match_distance_m=4.0,
+                              projection=GroundProjection(camera_height_m=CAMERA_HEIGHT_M))
+
+def store_detection(event):
+    """Queue one merged detection (a dedup.DetectionEvent) for the database writer thread."""
+    if event.latitude is not None:  # Seen only while there was no GPS position
+        writer.put(event.row(STORE_EVENT_DETAILS))
+
+def on_gps_fix(fix):
+    """Log every new fix and feed the ground speed to the survey scheduler."""
+    print(f"GPS - Latitude: {fix.lat}, Longitude: {fix.lon}")
+    if fix.speed is not None:
+        survey.update_speed(fix.speed)
+
+# Read the GPS in a separate thread, draining every sentence as it arrives
+gps = open_gps_reader(gps_port, on_gps_fix, max_extrapolate_s=MAX_EXTRAPOLATE_S).start()
+atexit.register(gps.stop)  # Stops the reader and closes a GPS_LOG recording however we exit
+
+def handle_results(frame, results):
+    """Track every crack or pothole detected in the frame and store the ones that went out of view."""
+    # Keep only the road-damage classes and categorize them
+    damage = DetectionBatch.from_results(results).only(*ROAD_CLASSES)
+
+    # Where the vehicle was when the frame was captured
+    position = gps.position_at(frame.captured_at)
+    for event in dedup.update(damage, frame.captured_at, position, frame.image.shape):
+        store_detection(event)  # Store the detection in the database
+
+def handle_skipped(frame):
+    """Store the cracks and potholes that went out of view while survey mode skips frames."""
+    for event in dedup.expire(frame.captured_at, gps.position_at(frame.captured_at)):
+        store_detection(event)
+
+# Capture, inference and display/storage run as separate stages
+# Draw every detected class, like results[0].plot() did: cracks in yellow, potholes in red
+overlay = OverlayRenderer(colors={0: (0, 255, 255), 1: (0, 0, 255)})
+pipeline = DetectionPipeline(picam2, model, handle_results=handle_results, handle_skipped=handle_skipped,
+                             scheduler=survey if SURVEY_MODE else None, overlay=overlay)
+pipeline.run()
 
 # Clean up and close all windows
 cv2.destroyAllWindows()
 picam2.stop()
-cursor.close()
+print(f"GPS: {gps.report()}")
+for event in dedup.flush():  # Objects still in view at the end
+    store_detection(event)
+report = dedup.report()
+print(f"Deduplication: {report['detections']} detections stored as {report['events']} rows "
+      f"({report['reduction']}x fewer), {report}")
+writer.stop()  # Writes whatever is still queued
+print(f"Database writer: {writer.report()}")
 db.close()
\ No newline at end of file
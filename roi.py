@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+from ultralytics.engine.results import Results
+
+# Road-region settings shared by every road-damage script. Override them with the
+# ROAD_ROI ("x1,y1,x2,y2" fractions) and ROAD_TILED ("1") environment variables.
+# Only the road can have damage: by default skip the top 45% of the frame (sky and buildings)
+ROAD_ROI = tuple(float(v) for v in os.environ.get("ROAD_ROI", "0,0.45,1,1").split(","))
+# Tiled mode captures at 640x640 and runs the road region as 2 overlapping tiles in one batch,
+# so thin cracks keep enough pixels; the cost per frame stays fixed at 2 tiles
+TILED = os.environ.get("ROAD_TILED", "0") == "1"
+CAPTURE_SIZE = (640, 640) if TILED else (320, 320)
+ROAD_TILES = (2, 1) if TILED else (1, 1)
+
+
+def nms(boxes, scores, classes, iou_threshold=0.5):
+    """Class-aware non-maximum suppression. Returns the indices of the boxes to keep."""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    # Shift each class into its own coordinate range so boxes of different classes never overlap
+    offset = classes[:, None] * (boxes.max() + 1)
+    shifted = boxes + offset
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def grid_tiles(x1, y1, x2, y2, cols, rows, overlap):
+    """Split a rectangle into cols x rows tiles that overlap by the given fraction."""
+    width, height = x2 - x1, y2 - y1
+    tile_w = int(round(width / (cols - (cols - 1) * overlap)))
+    tile_h = int(round(height / (rows - (rows - 1) * overlap)))
+    step_x = (width - tile_w) / (cols - 1) if cols > 1 else 0
+    step_y = (height - tile_h) / (rows - 1) if rows > 1 else 0
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            tx = x1 + int(round(col * step_x))
+            ty = y1 + int(round(row * step_y))
+            tiles.append((tx, ty, tx + tile_w, ty + tile_h))
+    return tiles
+
+
+class RoadRegionModel:
+    """Wraps a YOLO model so it only looks at the road part of the frame.
+
+    roi is (x1, y1, x2, y2) as fractions of the frame, e.g. (0, 0.45, 1, 1) drops
+    the sky and buildings in the top 45%. With tiles=(cols, rows) the road
+    region is further split into overlapping tiles (useful when capturing
+    above 320x320 so thin cracks keep their pixels). The tiles are sent to the
+    model as one batch, and the boxes are shifted back to frame coordinates and
+    de-duplicated with cross-tile NMS. The cost per frame is fixed by the number
+    of tiles.
+
+    Calling it returns a normal list of ultralytics Results for the whole frame
+    (or for each frame of a list of frames), so it can be used anywhere the
+    plain model was.
+    """
+
+    def __init__(self, model, roi=(0.0, 0.45, 1.0, 1.0), tiles=(1, 1), overlap=0.2, iou_threshold=0.5):
+        self.model = model
+        self.roi = roi
+        self.tiles = tiles
+        self.overlap = overlap
+        self.iou_threshold = iou_threshold
+        self._layout = {}  # Frame shape -> tile rectangles, worked out once per resolution
+
+    @classmethod
+    def from_env(cls, model, **kwargs):
+        """Wrap model with the shared ROAD_ROI and ROAD_TILES settings."""
+        return cls(model, roi=ROAD_ROI, tiles=ROAD_TILES, **kwargs)
+
+    @property
+    def names(self):
+        return self.model.names
+
+    @property
+    def ready(self):
+        """False while the wrapped model is still loading in the background."""
+        return getattr(self.model, "ready", True)
+
+    def tile_rects(self, shape):
+        """Pixel rectangles of the tiles for a frame of the given shape."""
+        if shape not in self._layout:
+            height, width = shape[:2]
+            fx1, fy1, fx2, fy2 = self.roi
+            x1, y1 = int(fx1 * width), int(fy1 * height)
+            x2, y2 = int(fx2 * width), int(fy2 * height)
+            cols, rows = self.tiles
+            self._layout[shape] = grid_tiles(x1, y1, x2, y2, cols, rows, self.overlap)
+        return self._layout[shape]
+
+    def __call__(self, source, **model_kwargs):
+        """Results for a frame (a one-item list), or one Results per frame for a list of frames.
+
+        The tiles of every frame in a list go to the model in a single call, so a
+        batch of frames costs one model call however many tiles each has.
+        """
+        frames = list(source) if isinstance(source, (list, tuple)) else [source]
+        layouts = [self.tile_rects(frame.shape) for frame in frames]
+        crops = [frame[ty1:ty2, tx1:tx2]  # Views, no copies
+                 for frame, rects in zip(frames, layouts) for tx1, ty1, tx2, ty2 in rects]
+        tile_results = self.model(crops if len(crops) > 1 else crops[0], **model_kwargs)
+
+        # Split the results back per frame
+        results = []
+        first = 0
+        for frame, rects in zip(frames, layouts):
+            results.append(self._merge(frame, rects, tile_results[first:first + len(rects)]))
+            first += len(rects)
+        return results
+
+    def _merge(self, frame, rects, tile_results):
+        """Combine one frame's tile results into a single Results in frame coordinates."""
+        merged = []
+        speed = {}
+        for (tx1, ty1, _, _), result in zip(rects, tile_results):
+            for stage, ms in result.speed.items():
+                speed[stage] = speed.get(stage, 0.0) + (ms or 0.0)
+            data = result.boxes.data
+            data = data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+            if len(data):
+                data = data.copy()
+                data[:, [0, 2]] += tx1  # Tile to frame coordinates
+                data[:, [1, 3]] += ty1
+                merged.append(data)
+
+        data = np.concatenate(merged) if merged else np.zeros((0, 6), dtype=np.float32)
+        if len(rects) > 1 and len(data):
+            keep = nms(data[:, :4], data[:, 4], data[:, 5], self.iou_threshold)
+            data = data[keep]
+
+        result = Results(frame, path="", names=self.names, boxes=data)
+        result.speed = speed
+        return result
@@ -1,21 +1,19 @@
+import atexit
 import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
+from frame_source import open_source
+from model_registry import load_model
 import mysql.connector
-import threading
-import time
-import serial
+from pipeline import DetectionPipeline
+from detections import DetectionBatch
+from gps_reader import open_gps_reader
+from db_writer import BatchWriter
+from dedup import DetectionDeduplicator, event_insert
  
 # Set up the camera with Picam
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
  
 # Load the YOLOv8 model
-model = YOLO("yolov8n_ncnn_model")
+model = load_model("yolov8n_ncnn_model")  # Loads and warms up in the background
  
 # Set up MySQL database connection
 db = mysql.connector.connect(
@@ -24,128 +22,56 @@ db = mysql.connector.connect(
     password="12345678",  # Your database password
     database="data"       # Your database name
 )
-cursor = db.cursor()
  
-# Lock for thread-safe database operations
-db_lock = threading.Lock()
+# Also store first/last seen, best confidence and hits per person (needs those columns, see dedup.py)
+STORE_EVENT_DETAILS = False
  
-# GPS Serial port setup (Assuming GPS module connected to /dev/serial0, adjust based on your setup)
-gps_port = "/dev/serial0"  # Replace with the correct port for your GPS
-ser = serial.Serial(gps_port, baudrate=9600, timeout=1)
- 
-# Global variables to store GPS coordinates
-latitude = None
-longitude = None
- 
-def store_detection(name, latitude, longitude):
-    """Store detection result into the MySQL database."""
-    try:
-        query = "INSERT INTO detected_people (name, latitude, longitude) VALUES (%s, %s, %s)"
-        values = (name, latitude, longitude)
-        
-        with db_lock:
-            cursor.execute(query, values)
-            db.commit()
-            print(f"Saved detection of {name} at ({latitude}, {longitude})")
-    except Exception as e:
-        print(f"Error saving detection to DB: {e}")
- 
-def parse_gps_data(data):
-    """Parse the NMEA sentence to extract latitude and longitude."""
-    global latitude, longitude
-    try:
-        parts = data.split(",")
-        
-        # Handle $GPGGA sentence: Global Positioning System Fix Data
-        if parts[0] == "$GPGGA":
-            # Ensure there are enough parts and check if latitude and longitude are available
-            if len(parts) >= 6 and parts[2] and parts[4]:
-                lat_deg = float(parts[2]) // 100  # Degrees (before the dot)
-                lat_min = float(parts[2]) % 100  # Minutes (after the dot)
-                lon_deg = float(parts[4]) // 100  # Degrees (before the dot)
-                lon_min = float(parts[4]) % 100  # Minutes (after the dot)
-                
-                # Convert minutes to decimal degrees
-                lat = lat_deg + (lat_min / 60)
-                lon = lon_deg + (lon_min / 60)
-                
-                # Apply direction
-                if parts[3] == "S":  # South hemisphere
-                    lat = -lat
-                if parts[5] == "W":  # West hemisphere
-                    lon = -lon
+# Detections are inserted in batches by a writer thread, so inference never waits on MySQL
+writer = BatchWriter(db, event_insert("detected_people", STORE_EVENT_DETAILS), name="detected_people").start()
  
-                latitude = lat
-                longitude = lon
-                print(f"GPS - Latitude: {lat}, Longitude: {lon}")
-            else:
-                print("Invalid data in $GPGGA sentence (missing latitude or longitude).")
-                
-    except Exception as e:
-        print(f"Error parsing GPS data: {e}")
+# A person stays in view for many frames: merge their sightings and store them once, when out of view
+dedup = DetectionDeduplicator({0: "Person"})  # Class 0 is "person" in the COCO dataset for YOLO
  
-def read_gps_data():
-    """Read and process GPS data indefinitely."""
-    try:
-        while True:
-            data = ser.readline()
-            if data:
-                decoded_data = data.decode('utf-8').strip()  # Decode the data
-                parse_gps_data(decoded_data)  # Parse the NMEA sentence for GPS info
-            time.sleep(1)  # Delay to avoid overwhelming the output
-    except Exception as e:
-        print(f"Error reading GPS data: {e}")
- 
-# Start the GPS reading in a separate thread
-gps_thread = threading.Thread(target=read_gps_data)
-gps_thread.daemon = True  # Allows the thread to exit when the main program ends
-gps_thread.start()
- 
-while True:
-    # Capture a frame from the camera
-    frame = picam2.capture_array()
-    
-    # Run YOLO model on the captured frame
-    results = model(frame)
-    
-    # Annotate the frame with detection results
-    annotated_frame = results[0].plot()
+# GPS Serial port setup (Assuming GPS module connected to /dev/serial0, adjust based on your setup)
+gps_port = "/dev/serial0"  # Replace with the correct port for your GPS (GPS_PORT overrides it, e.g. a replay)
  
-    # Get inference time and FPS
-    inference_time = results[0].speed['inference']
-    fps = 1000 / inference_time  # Convert to milliseconds
-    text = f'FPS: {fps:.1f}'
+# Past the newest fix, positions are extrapolated from its speed and heading for at most this many seconds
+MAX_EXTRAPOLATE_S = 1.5
  
-    # Define font and position for FPS display
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    text_size = cv2.getTextSize(text, font, 1, 2)[0]
-    text_x = annotated_frame.shape[1] - text_size[0] - 10  # 10 pixels from the right
-    text_y = text_size[1] + 10  # 10 pixels from the top
+def store_detection(event):
+    """Queue one merged detection (a dedup.DetectionEvent) for the database writer thread."""
+    if event.latitude is not None:  # Seen only while there was no GPS position
+        writer.put(event.row(STORE_EVENT_DETAILS))
  
-    # Draw FPS text on the frame
-    cv2.putText(annotated_frame, text, (text_x, text_y), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
+def on_gps_fix(fix):
+    """Log every new fix."""
+    print(f"GPS - Latitude: {fix.lat}, Longitude: {fix.lon}")
  
-    # Loop through detections to check for the "person" class
-    for obj in results[0].boxes:
-        # Get the label (class) of the detected object
-        label = int(obj.cls[0])  # Convert to int
-        
-        # Check if the detected object is a "person"
-        if label == 0:  # Class 0 corresponds to "person" in COCO dataset for YOLO
-            # Store "Person" as the name
-            name = "Person"
-            if latitude is not None and longitude is not None:
-                store_detection(name, latitude, longitude)  # Store the detection in the database
+# Read the GPS in a separate thread, draining every sentence as it arrives
+gps = open_gps_reader(gps_port, on_gps_fix, max_extrapolate_s=MAX_EXTRAPOLATE_S).start()
+atexit.register(gps.stop)  # Stops the reader and closes a GPS_LOG recording however we exit
  
-    # Display the annotated frame
-    cv2.imshow("Camera", annotated_frame)
+def handle_results(frame, results):
+    """Track every person detected in the frame and store the ones that went out of view."""
+    # Keep only the "person" class (class 0 in the COCO dataset for YOLO)
+    people = DetectionBatch.from_results(results).only(0)
+    position = gps.position_at(frame.captured_at)  # Where we were when the frame was captured
+    for event in dedup.update(people, frame.captured_at, position):
+        store_detection(event)  # Store the detection in the database
  
-    # Exit the program if 'q' is pressed
-    if cv2.waitKey(1) == ord("q"):
-        break
+# Capture, inference and display/storage run as separate stages
+pipeline = DetectionPipeline(picam2, model, handle_results=handle_results)
+pipeline.run()
  
 # Clean up and close all windows
 cv2.destroyAllWindows()
 picam2.stop()
-cursor.close()
+print(f"GPS: {gps.report()}")
+for event in dedup.flush():  # People still in view at the end
+    store_detection(event)
+report = dedup.report()
+print(f"Deduplication: {report['detections']} detections stored as {report['events']} rows "
+      f"({report['reduction']}x fewer), {report}")
+writer.stop()  # Writes whatever is still queued
+print(f"Database writer: {writer.report()}")
 db.close()
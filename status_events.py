@@ -0,0 +1,108 @@
+import asyncio
+import json
+import threading
+
+from frame_broadcaster import AsyncWaiter
+
+
+class StatusChannel:
+    """Latest status fields of a server, pushed to browsers as server-sent events.
+
+    update() records only fields whose value actually changed and wakes the
+    streams, and each stream sends just the fields that changed since its last
+    event. A client that connects gets the full state first, so it never has to
+    poll for the starting values.
+    """
+
+    def __init__(self, keepalive_s=15.0):
+        self.keepalive_s = keepalive_s  # Comment lines sent while idle so proxies don't drop the connection
+        self._cond = threading.Condition()
+        self._state = {}
+        self._changed_at = {}  # field -> sequence number of its last change
+        self._seq = 0
+        self._running = True
+        self.clients = 0
+        self.events_sent = 0
+        self._waiter = None  # AsyncWaiter for stream_async(), made on first use
+
+    def update(self, **fields):
+        """Set status fields; streams are only woken if one of them changed."""
+        with self._cond:
+            changed = [k for k, v in fields.items() if k not in self._state or self._state[k] != v]
+            if not changed:
+                return False
+            self._seq += 1
+            for key in changed:
+                self._state[key] = fields[key]
+                self._changed_at[key] = self._seq
+            self._cond.notify_all()
+            seq = self._seq
+        if self._waiter is not None:
+            self._waiter.notify(seq)
+        return True
+
+    def snapshot(self):
+        with self._cond:
+            return dict(self._state)
+
+    def _changes_since(self, seq):
+        return {k: self._state[k] for k, at in self._changed_at.items() if at > seq}
+
+    def stream(self):
+        """Yield SSE messages: the current state, then every change as it happens."""
+        with self._cond:
+            self.clients += 1
+        try:
+            seq = 0  # Every change has a higher number, so the first event is the full state
+            while self._running:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > seq or not self._running, self.keepalive_s)
+                    if self._seq == seq:
+                        changes = None
+                    else:
+                        changes = self._changes_since(seq)
+                        seq = self._seq
+                if changes is None:
+                    yield ": keepalive\n\n"
+                    continue
+                self.events_sent += 1
+                yield f"data: {json.dumps(changes)}\n\n"
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    async def stream_async(self):
+        """stream() for asyncio servers: an idle client holds a coroutine, not a thread."""
+        with self._cond:
+            if self._waiter is None:
+                self._waiter = AsyncWaiter(self._seq)
+            waiter = self._waiter
+            self.clients += 1
+        try:
+            seq = 0  # Every change has a higher number, so the first event is the full state
+            # The waiter's own number, which trails seq while a wake-up is still queued on the
+            # event loop; waiting on seq instead would return at once and spin without yielding
+            woken = waiter.seq
+            while self._running:
+                with self._cond:
+                    changes = self._changes_since(seq)
+                    seq = self._seq
+                if changes:
+                    self.events_sent += 1
+                    yield f"data: {json.dumps(changes)}\n\n"
+                    continue
+                try:
+                    woken = await asyncio.wait_for(waiter.wait(woken), self.keepalive_s)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def close(self):
+        """End every open stream."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._waiter is not None:
+            self._waiter.close()
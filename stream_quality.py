@@ -0,0 +1,139 @@
+import threading
+import time
+
+import cv2
+
+# (JPEG quality, downscale factor) from best to cheapest. Clients only ever use one of
+# these levels, so clients on the same level can share one encode of each frame.
+QUALITY_LEVELS = [(90, 1.0), (80, 1.0), (70, 1.0), (60, 0.75), (50, 0.75), (40, 0.5), (30, 0.5)]
+START_LEVEL = 1
+
+
+def encode_jpeg(image, quality=None, scale=1.0):
+    """JPEG-encode image at the given quality (None for OpenCV's default), shrunk by scale first."""
+    if scale != 1.0:
+        height, width = image.shape[:2]
+        image = cv2.resize(image, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_AREA)
+    params = [cv2.IMWRITE_JPEG_QUALITY, int(quality)] if quality is not None else []
+    ok, buffer = cv2.imencode('.jpg', image, params)
+    return buffer.tobytes() if ok else None
+
+
+class ClientStream:
+    """Picks the JPEG quality and size for one streaming client from how fast its frames actually go out.
+
+    After each frame, record() is told how many bytes were sent and how long
+    that took. If the frames are bigger than what the link delivers within one
+    frame period at target_fps (or than target_kbps allows), the client drops a
+    level; after a run of frames with plenty of headroom it climbs back one.
+    """
+
+    def __init__(self, name, target_fps=15.0, target_kbps=None, level=START_LEVEL,
+                 step_up_after=10, smoothing=0.3):
+        self.name = name
+        self.target_fps = target_fps
+        self.target_kbps = target_kbps  # Optional cap on the bitrate, e.g. for a metered link
+        self.level = level
+        self.step_up_after = step_up_after
+        self.smoothing = smoothing
+        self.throughput = None  # Smoothed bytes/s the link has delivered
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.level_changes = 0
+        self.connected_at = time.monotonic()
+        self._headroom_frames = 0
+
+    @property
+    def quality(self):
+        return QUALITY_LEVELS[self.level][0]
+
+    @property
+    def scale(self):
+        return QUALITY_LEVELS[self.level][1]
+
+    def affordable_bytes(self):
+        """Largest frame that fits the link (and the bitrate target) at target_fps."""
+        period = 1.0 / self.target_fps
+        affordable = self.throughput * period
+        if self.target_kbps:
+            affordable = min(affordable, self.target_kbps * 1000 / 8 * period)
+        return affordable
+
+    def record(self, nbytes, seconds):
+        """Account one frame of nbytes that took seconds to deliver and choose the next level."""
+        self.bytes_sent += nbytes
+        self.frames_sent += 1
+        rate = nbytes / max(seconds, 1e-4)
+        self.throughput = rate if self.throughput is None else \
+            (1 - self.smoothing) * self.throughput + self.smoothing * rate
+
+        affordable = self.affordable_bytes()
+        if nbytes > affordable and self.level < len(QUALITY_LEVELS) - 1:
+            self._set_level(self.level + 1)
+        elif nbytes < 0.5 * affordable and self.level > 0:
+            self._headroom_frames += 1
+            if self._headroom_frames >= self.step_up_after:
+                self._set_level(self.level - 1)
+        else:
+            self._headroom_frames = 0
+
+    def _set_level(self, level):
+        self.level = level
+        self.level_changes += 1
+        self._headroom_frames = 0
+
+    def report(self):
+        elapsed = time.monotonic() - self.connected_at
+        return {
+            "quality": self.quality,
+            "scale": self.scale,
+            "target_fps": self.target_fps,
+            "target_kbps": self.target_kbps,
+            "bytes_sent": self.bytes_sent,
+            "frames_sent": self.frames_sent,
+            "fps": round(self.frames_sent / elapsed, 2) if elapsed > 0 else 0.0,
+            "kbps": round(self.bytes_sent * 8 / 1000 / elapsed, 1) if elapsed > 0 else 0.0,
+            "link_kbps": round(self.throughput * 8 / 1000, 1) if self.throughput else None,
+            "level_changes": self.level_changes,
+        }
+
+
+class StreamStats:
+    """Every streaming client of a server, with bytes sent per client and in total."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._next_id = 0
+        self.closed_bytes = 0  # Bytes sent to clients that have since disconnected
+        self.closed_frames = 0
+
+    def open(self, kind, args=None, **kwargs):
+        """Register a new client; target fps / kbps can come from its query string (args, any mapping)."""
+        if args is not None:
+            for key, name in (("fps", "target_fps"), ("kbps", "target_kbps")):
+                try:
+                    value = float(args.get(key) or 0)
+                except ValueError:
+                    continue  # Ignore a malformed value and keep the default
+                if value > 0:
+                    kwargs.setdefault(name, value)
+        with self._lock:
+            self._next_id += 1
+            stream = ClientStream(f"{kind}-{self._next_id}", **kwargs)
+            self._clients[stream.name] = stream
+        return stream
+
+    def close(self, stream):
+        with self._lock:
+            if self._clients.pop(stream.name, None) is not None:
+                self.closed_bytes += stream.bytes_sent
+                self.closed_frames += stream.frames_sent
+
+    def report(self):
+        with self._lock:
+            clients = {name: stream.report() for name, stream in self._clients.items()}
+            total = self.closed_bytes + sum(s.bytes_sent for s in self._clients.values())
+            frames = self.closed_frames + sum(s.frames_sent for s in self._clients.values())
+        return {"clients": clients, "total_bytes_sent": total, "total_frames_sent": frames}
@@ -0,0 +1,89 @@
+import threading
+import time
+
+
+class SurveyScheduler:
+    """Decides which frames to run the road-damage model on, by distance travelled.
+
+    Feed it ground speed from the GPS (RMC/VTG) with update_speed(). Between
+    speed reports the latest speed is integrated over time, and a frame is let
+    through every spacing_m metres, so road coverage per metre stays the same
+    whether the car is crawling or at full speed. Below min_speed_kmh (stopped at
+    a light, parked) nothing is inferred at all. If no speed has been heard
+    for stale_after seconds, frames are let through once every fallback_interval
+    seconds instead.
+    """
+
+    def __init__(self, spacing_m=5.0, min_speed_kmh=3.0, stale_after=3.0, fallback_interval=1.0):
+        self.spacing_m = spacing_m
+        self.min_speed_mps = min_speed_kmh / 3.6
+        self.stale_after = stale_after
+        self.fallback_interval = fallback_interval
+
+        self._lock = threading.Lock()
+        self._speed_mps = None
+        self._speed_at = None  # Monotonic time of the last speed report
+        self._integrated_at = None  # Monotonic time distance was last integrated up to
+        self._distance_since_inference = 0.0
+        self._last_fallback = 0.0
+
+        self.frames = 0
+        self.inferred = 0
+        self.paused = 0  # Frames dropped because the vehicle was (nearly) stopped
+        self.distance_m = 0.0
+
+    def update_speed(self, speed_mps, now=None):
+        """Record a new ground speed reading (metres per second)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._speed_at is not None and now - self._speed_at > self.stale_after:
+                self._integrated_at = now  # Speed was lost: the gap is covered by the fallback, not integrated
+            self._integrate(now)
+            self._speed_mps = speed_mps
+            self._speed_at = now
+
+    def _integrate(self, now):
+        # Add the distance covered at the last known speed since we last looked
+        if self._speed_mps is not None and self._integrated_at is not None:
+            step = self._speed_mps * max(0.0, now - self._integrated_at)
+            self._distance_since_inference += step
+            self.distance_m += step
+        self._integrated_at = now
+
+    def should_infer(self, frame=None, now=None):
+        """Return True if this frame should go through the model."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.frames += 1
+            if self._speed_at is None or now - self._speed_at > self.stale_after:
+                # No usable speed: fall back to a slow fixed rate. The stale speed must
+                # not be integrated over this gap once speed reports come back.
+                self._integrated_at = now
+                if now - self._last_fallback >= self.fallback_interval:
+                    self._last_fallback = now
+                    self.inferred += 1
+                    return True
+                return False
+
+            self._integrate(now)
+            if self._speed_mps < self.min_speed_mps:
+                self.paused += 1
+                return False
+            if self._distance_since_inference >= self.spacing_m:
+                self._distance_since_inference = 0.0
+                self.inferred += 1
+                return True
+            return False
+
+    @property
+    def speed_kmh(self):
+        return None if self._speed_mps is None else self._speed_mps * 3.6
+
+    def report(self):
+        return {
+            "frames": self.frames,
+            "inferred": self.inferred,
+            "paused": self.paused,
+            "distance_m": round(self.distance_m, 1),
+            "inferences_per_km": round(self.inferred / (self.distance_m / 1000), 1) if self.distance_m else 0.0,
+        }
@@ -0,0 +1,61 @@
+import os
+import threading
+import time
+
+import pytest
+
+from gps_log import GpsLogWriter, open_pty, read_log, replay
+
+SENTENCE = "$GNGGA,120000.00,5130.0000,N,00007.0000,W,1,08,1.0,10.0,M,0.0,M,,*00"
+
+
+def _record_two_sessions(path):
+    for _ in range(2):
+        log = GpsLogWriter(path)
+        for at in (100.0, 100.1, 100.2):
+            log.write(SENTENCE, at=at)
+        log.close()
+
+
+@pytest.mark.parametrize("name", ["drive.nmea", "drive.nmea.gz"])
+def test_appended_session_carries_on_from_the_last_offset(tmp_path, name):
+    path = str(tmp_path / name)
+    _record_two_sessions(path)
+    offsets = [offset for offset, _ in read_log(path)]
+    assert offsets == pytest.approx([0.0, 0.1, 0.2, 0.2, 0.3, 0.4])
+
+
+def test_read_log_handles_sessions_appended_without_a_session_line(tmp_path):
+    path = tmp_path / "old.nmea"
+    path.write_text("".join(f"{t}\t{SENTENCE}\n" for t in ("0.000", "0.100", "0.000", "0.100")))
+    offsets = [offset for offset, _ in read_log(str(path))]
+    assert offsets == pytest.approx([0.0, 0.1, 0.1, 0.2])
+
+
+def test_replay_paces_the_second_session(tmp_path):
+    path = str(tmp_path / "drive.nmea")
+    _record_two_sessions(path)
+    master, slave = open_pty()
+    arrivals = []
+
+    def read():
+        fd = os.open(slave, os.O_RDONLY | os.O_NOCTTY)
+        buffer = b""
+        while len(arrivals) < 6:
+            buffer += os.read(fd, 4096)
+            while b"\r\n" in buffer:
+                _, buffer = buffer.split(b"\r\n", 1)
+                arrivals.append(time.monotonic())
+        os.close(fd)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    stats = replay(path, master, speed=1.0, wait_s=0.1)
+    reader.join(timeout=2.0)
+    os.close(master)
+
+    assert stats["sentences"] == 6
+    assert len(arrivals) == 6
+    # The second session plays over its recorded 0.2 s instead of in one burst
+    assert arrivals[5] - arrivals[3] >= 0.15
+    assert arrivals[5] - arrivals[0] >= 0.35
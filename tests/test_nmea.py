@@ -0,0 +1,58 @@
+import pytest
+
+from nmea import MAX_SPEED_AGE_S, NmeaParser
+
+
+def _sentence(body):
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}"
+
+
+def gga(seconds):
+    return _sentence(f"GNGGA,1200{seconds:02d}.00,5130.0000,N,00007.0000,W,1,08,1.0,10.0,M,0.0,M,,")
+
+
+def rmc(seconds, status="A", knots="10.0", course="90.0"):
+    return _sentence(f"GNRMC,1200{seconds:02d}.00,{status},5130.0000,N,00007.0000,W,{knots},{course},181026,,,A")
+
+
+def vtg(kmh="36.0"):
+    return _sentence(f"GNVTG,90.0,T,,M,,N,{kmh},K,A")
+
+
+def test_gga_carries_the_speed_from_rmc():
+    parser = NmeaParser()
+    parser.feed(rmc(0))
+    fix = parser.feed(gga(1))
+    assert fix.speed == pytest.approx(10.0 * 0.514444)
+    assert fix.heading == 90.0
+
+
+def test_rmc_without_a_fix_clears_the_speed():
+    parser = NmeaParser()
+    parser.feed(rmc(0))
+    assert parser.feed(rmc(1, status="V", knots="", course="")) is None
+    fix = parser.feed(gga(1))
+    assert fix.speed is None
+    assert fix.heading is None
+
+
+@pytest.mark.parametrize("report", [lambda: rmc(0), vtg])
+def test_speed_is_dropped_once_no_longer_reported(report):
+    parser = NmeaParser()
+    parser.feed(gga(0))
+    parser.feed(report())
+    assert parser.feed(gga(int(MAX_SPEED_AGE_S))).speed is not None
+    fix = parser.feed(gga(int(MAX_SPEED_AGE_S) + 1))
+    assert fix.speed is None
+    assert fix.heading is None
+
+
+def test_speed_is_kept_while_it_keeps_being_reported():
+    parser = NmeaParser()
+    for second in range(10):
+        fix = parser.feed(gga(second))
+        parser.feed(rmc(second))
+    assert fix.speed == pytest.approx(10.0 * 0.514444)
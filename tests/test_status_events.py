@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+
+from status_events import StatusChannel
+
+
+def _run_with_watchdog(coro_fn, timeout=5.0):
+    """Run an asyncio coroutine on its own thread; a coroutine that never yields can't be cancelled from inside."""
+    outcome = {}
+
+    def target():
+        outcome["result"] = asyncio.run(coro_fn())
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "stream_async stopped yielding to the event loop"
+    return outcome["result"]
+
+
+def test_stream_async_keeps_yielding_with_updates_from_another_thread():
+    channel = StatusChannel(keepalive_s=0.5)
+    channel.update(movement="S", counter=0)
+    # Count the stream's passes: a stream that wakes without suspending re-reads the changes endlessly
+    # (on Python 3.12+ it never yields at all, which the watchdog catches)
+    reads = []
+    changes_since = channel._changes_since
+    channel._changes_since = lambda seq: reads.append(seq) or changes_since(seq)
+
+    async def consume():
+        loop = asyncio.get_running_loop()
+        events = []
+        stream = channel.stream_async()
+        events.append(await stream.__anext__())  # Full state; also creates the waiter
+
+        # Deliver every wake-up late, so the channel's seq runs ahead of the waiter's
+        waiter = channel._waiter
+        waiter.notify = lambda seq: loop.call_soon_threadsafe(loop.call_later, 0.05, waiter._wake, seq)
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+
+        # Fire the updates from another thread while the subscriber is mid-iteration
+        def fire():
+            for i in range(1, 6):
+                channel.update(counter=i)
+                time.sleep(0.02)  # Spaced so a change lands while an earlier wake-up is still pending
+
+        updater = threading.Thread(target=fire)
+        updater.start()
+        while '"counter": 5' not in events[-1]:
+            events.append(await asyncio.wait_for(stream.__anext__(), 2.0))
+        updater.join()
+        ticker.cancel()
+        await stream.aclose()
+        return events, ticks
+
+    events, ticks = _run_with_watchdog(consume)
+    assert json.loads(events[0][len("data: "):]) == {"movement": "S", "counter": 0}
+    assert all(event.startswith(("data: ", ": keepalive")) for event in events)
+    assert any('"counter": 5' in event for event in events)
+    assert ticks > 0  # Other coroutines kept running while the stream waited
+    assert len(reads) < 50
+
+
+def test_stream_async_sends_keepalive_while_idle():
+    channel = StatusChannel(keepalive_s=0.05)
+    channel.update(movement="F")
+
+    async def consume():
+        stream = channel.stream_async()
+        first = await stream.__anext__()
+        second = await stream.__anext__()
+        await stream.aclose()
+        return first, second
+
+    first, second = _run_with_watchdog(consume)
+    assert first.startswith("data: ")
+    assert second == ": keepalive\n\n"
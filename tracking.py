@@ -1,39 +1,31 @@
 import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
-import time
+from frame_source import open_source
+from model_registry import load_model
+from motion_gate import MotionGate
+from detections import DetectionBatch
 
 # Set up the camera with Picamera2
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320, 320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
 # Load YOLOv8 model
-model = YOLO("yolov8n_ncnn_model")
+model = load_model("yolov8n_ncnn_model")  # Loads and warms up in the background
 
 # Define human class ID (COCO index for 'person' is 0)
 human_class_id = 0
 
+# Skip YOLO while nothing in view is moving, re-checking at least every 15 frames
+gate = MotionGate(threshold=2.0, refresh_every=15)
+
 while True:
     frame = picam2.capture_array()
-    results = model(frame, imgsz=320)
-
-    humans = []
-    for result in results[0].boxes:
-        if int(result.cls) == human_class_id:
-            x1, y1, x2, y2 = result.xyxy[0].tolist()
-            confidence = result.conf[0].item()
-            humans.append((x1, y1, x2, y2, confidence))
+    results = gate.run(model, frame, imgsz=320)
 
-    if humans:
-        # Select the closest human based on bounding box size
-        humans.sort(key=lambda b: (b[2] - b[0]) * (b[3] - b[1]), reverse=True)
-        target_human = humans[0]
+    humans = DetectionBatch.from_results(results).only(human_class_id)
 
-        x1, y1, x2, y2, _ = target_human
+    # Select the closest human based on bounding box size
+    target_human = humans.largest()
+    if target_human is not None:
+        x1, y1, x2, y2 = humans.box(target_human)
         center_x = (x1 + x2) // 2
 
         # Draw the selected human bounding box
@@ -65,3 +57,4 @@ while True:
 
 # Clean up
 cv2.destroyAllWindows()
+print(f"Motion gate: {gate.report()}")
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import threading
+import time
+
+from starlette.websockets import WebSocketDisconnect
+
+from stream_quality import encode_jpeg
+
+
+class StreamFrame:
+    """One produced frame: the image, its detection record and its JPEG encodings.
+
+    Each encoding (annotated or not, at a given quality and scale) is made the
+    first time a client asks for it and then shared by every client on the
+    same level, so ten viewers cost one encode per level, not ten.
+    """
+
+    def __init__(self, image, meta, annotate=None):
+        self.image = image
+        self.meta = meta  # JSON-serialisable detection record sent ahead of the pixels
+        self._annotate = annotate  # Optional callback(image) drawing the boxes, for clients that can't
+        self._lock = threading.Lock()
+        self._jpeg = {}
+
+    def jpeg(self, annotated=False, quality=None, scale=1.0):
+        """The frame as JPEG bytes; annotated=True burns the boxes in (for MJPEG clients)."""
+        key = (annotated, quality, scale)
+        with self._lock:
+            if key not in self._jpeg:
+                image = self.image
+                if annotated and self._annotate is not None:
+                    image = self._annotate(image.copy())
+                self._jpeg[key] = encode_jpeg(image, quality, scale)
+            return self._jpeg[key]
+
+
+async def stream_to_socket(websocket, broadcaster, stream, ack_timeout=2.0):
+    """Send one client the newest frame each time it has drawn the previous one.
+
+    Every frame goes out as a JSON text message (its detection record) followed
+    by a binary message (the clean JPEG); the page draws the boxes itself and
+    answers with an ack. Only one frame is ever in flight, so a slow client
+    skips frames instead of queueing them and always sees the live picture.
+    The send-to-ack time of each frame drives the client's quality level
+    (stream is its stream_quality.ClientStream). The record carries the scale,
+    so the page can map the boxes onto a downscaled frame.
+    """
+    loop = asyncio.get_running_loop()
+    sent = skipped = 0
+    last_id = None
+    await websocket.accept()
+    try:
+        async for frame in broadcaster.subscribe_async():
+            # Encoding runs in a worker thread so the event loop keeps serving other clients
+            jpeg = await loop.run_in_executor(None, frame.jpeg, False, stream.quality, stream.scale)
+            if jpeg is None:
+                continue
+            frame_id = frame.meta.get("frame_id")
+            if last_id is not None and frame_id is not None:
+                skipped += max(frame_id - last_id - 1, 0)
+            last_id = frame_id
+            meta = json.dumps(dict(frame.meta, scale=stream.scale))
+            started = time.monotonic()
+            await websocket.send_text(meta)
+            await websocket.send_bytes(jpeg)
+            sent += 1
+            # Frames published while we wait here are dropped by the broadcaster
+            try:
+                await asyncio.wait_for(websocket.receive_text(), ack_timeout)
+            except asyncio.TimeoutError:
+                pass
+            stream.record(len(jpeg) + len(meta), time.monotonic() - started)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        print(f"Video socket closed: sent {sent} frames, skipped {skipped} for a slow client")
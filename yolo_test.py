@@ -1,48 +1,18 @@
 import cv2
-from picamera2 import Picamera2
-from ultralytics import YOLO
+from frame_source import open_source
+from model_registry import load_model
+from pipeline import DetectionPipeline
 
 # Set up the camera with Picam
-picam2 = Picamera2()
-picam2.preview_configuration.main.size = (320,320)
-picam2.preview_configuration.main.format = "RGB888"
-picam2.preview_configuration.align()
-picam2.configure("preview")
-picam2.start()
+picam2 = open_source()  # Pi camera, or a recording/synthetic feed via FRAME_SOURCE
 
 # Load our YOLOv8 model
-model = YOLO("yolov8n_ncnn_model")
+model = load_model("yolov8n_ncnn_model")  # Loads and warms up in the background
 
-while True:
-    # Capture a frame from the camera
-    frame = picam2.capture_array()
-    
-    # Run YOLO model on the captured frame and store the results
-    results = model(frame)
-    
-    # Output the visual detection data, we will draw this on our camera preview window
-    annotated_frame = results[0].plot()
-    
-    # Get inference time
-    inference_time = results[0].speed['inference']
-    fps = 1000 / inference_time  # Convert to milliseconds
-    text = f'FPS: {fps:.1f}'
-
-    # Define font and position
-    font = cv2.FONT_HERSHEY_SIMPLEX
-    text_size = cv2.getTextSize(text, font, 1, 2)[0]
-    text_x = annotated_frame.shape[1] - text_size[0] - 10  # 10 pixels from the right
-    text_y = text_size[1] + 10  # 10 pixels from the top
-
-    # Draw the text on the annotated frame
-    cv2.putText(annotated_frame, text, (text_x, text_y), font, 1, (255, 255, 255), 2, cv2.LINE_AA)
-
-    # Display the resulting frame
-    cv2.imshow("Camera", annotated_frame)
-
-    # Exit the program if q is pressed
-    if cv2.waitKey(1) == ord("q"):
-        break
+# Capture, inference and display run as separate stages so none of them waits on the others
+pipeline = DetectionPipeline(picam2, model)
+pipeline.run()
 
 # Close all windows
-cv2.destroyAllWindows()
\ No newline at end of file
+cv2.destroyAllWindows()
+picam2.stop()